@@ -0,0 +1,104 @@
+"""Assignment 2 - Blocky
+
+=== CSC148 Fall 2017 ===
+Diane Horton and David Liu
+Department of Computer Science,
+University of Toronto
+
+
+=== Module Description ===
+
+This file contains functions for scoring boards stored as bitboards.
+
+A bitboard holds the unit cells of one colour on a board as a single Python
+int.  The cells of each column are consecutive bits, in row order, followed by
+one guard bit that is never set, so bit (column * (width + 1) + row) is set
+iff the unit cell at (column, row) has the colour.  The guard bits stop
+shifts and carries from spilling from the bottom of one column into the top
+of the next.
+"""
+from functools import lru_cache
+from typing import List, Tuple
+import numpy as np
+
+
+def bitboards(grid: np.ndarray, num_colours: int) -> List[int]:
+    """Return a bitboard for each of the <num_colours> colour indices in the
+    square colour-index <grid>, indexed by colour index.
+    """
+    width = len(grid)
+    padded = np.zeros((width, width + 1), dtype=np.uint8)
+    padded[:, :width] = grid
+    padded[:, width] = num_colours
+    return [int.from_bytes(np.packbits(padded.ravel() == colour,
+                                       bitorder='little').tobytes(),
+                           'little')
+            for colour in range(num_colours)]
+
+
+def popcount(bits: int) -> int:
+    """Return the number of set bits in <bits>.
+    """
+    return bin(bits).count('1')
+
+
+if hasattr(int, 'bit_count'):
+    # Python 3.10 and later count the bits without building a string.
+    popcount = int.bit_count
+
+
+@lru_cache(maxsize=None)
+def edge_masks(width: int) -> Tuple[int, int, int, int]:
+    """Return bitboards of the cells along the left, right, top and bottom
+    edges of a board <width> cells wide.
+    """
+    stride = width + 1
+    left = (1 << width) - 1
+    right = left << (stride * (width - 1))
+    top = sum(1 << (column * stride) for column in range(width))
+    bottom = top << (width - 1)
+    return left, right, top, bottom
+
+
+def perimeter_count(bits: int, width: int) -> int:
+    """Return the number of cells of bitboard <bits> along the edges of a
+    board <width> cells wide, counting corner cells twice.
+    """
+    return sum(popcount(bits & edge) for edge in edge_masks(width))
+
+
+def largest_blob(bits: int, width: int) -> int:
+    """Return the number of cells in the largest connected blob of bitboard
+    <bits> on a board <width> cells wide.
+
+    Each blob is flood filled from its lowest cell in bit-parallel steps.
+    Every step fills each column upwards as far as the blob goes at once, by
+    letting the carry of an addition run through the set bits above the
+    blob, and grows the blob by one cell down and sideways with shifts.  The
+    search stops as soon as the cells left cannot make a bigger blob.
+    """
+    stride = width + 1
+    best = 0
+    remaining = bits
+    while remaining and popcount(remaining) > best:
+        blob = remaining & -remaining
+        while True:
+            upward = (bits & ~(bits + blob)) | blob
+            grown = (upward | upward >> 1 | upward << stride |
+                     upward >> stride) & bits
+            if grown == blob:
+                break
+            blob = grown
+        best = max(best, popcount(blob))
+        remaining &= ~blob
+    return best
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', 'functools', 'numpy'
+        ]
+    })
@@ -0,0 +1,26 @@
+import numpy as np
+from bitboard import bitboards, largest_blob, perimeter_count
+
+
+def test_perimeter_count() -> None:
+    """Each edge cell is counted once per edge it lies along.
+    """
+    grid = np.array([[0, 0, 1],
+                     [1, 0, 1],
+                     [1, 1, 1]], dtype=np.uint8)
+    zeros, ones = bitboards(grid, 2)
+    assert perimeter_count(zeros, 3) == 3
+    assert perimeter_count(ones, 3) == 9
+
+
+def test_largest_blob_does_not_wrap() -> None:
+    """The bottom cell of one column and the top cell of the next are not
+    connected, but a blob that turns corners is found whole.
+    """
+    grid = np.array([[0, 1, 1, 1],
+                     [1, 0, 0, 0],
+                     [1, 0, 1, 1],
+                     [1, 0, 1, 0]], dtype=np.uint8)
+    zeros, ones = bitboards(grid, 2)
+    assert largest_blob(ones, 4) == 3
+    assert largest_blob(zeros, 4) == 5
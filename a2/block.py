@@ -10,14 +10,104 @@ University of Toronto
 
 This file contains the Block class, the main data structure used in the game.
 """
-from typing import Optional, Tuple, List
+from typing import Iterator, Optional, Tuple, List
 import random
 import math
-from renderer import COLOUR_LIST, TEMPTING_TURQUOISE, BLACK, colour_name
+import numpy as np
+from bitboard import bitboards
+from zobrist import zobrist_hashes
+from renderer import COLOUR_LIST, TEMPTING_TURQUOISE, BLACK, colour_name, \
+    colour_index
 
 HIGHLIGHT_COLOUR = TEMPTING_TURQUOISE
 FRAME_COLOUR = BLACK
 
+# The most changed Blocks a tree remembers between draws.  Past this, the
+# whole board is redrawn, which is cheaper than many small redraws anyway.
+DAMAGE_LIMIT = 64
+
+# The (column, row) offset of each child, in half-sizes of its parent,
+# indexed in the order in which children are stored.
+QUADRANT_OFFSETS = [(1, 0), (0, 0), (0, 1), (1, 1)]
+
+# The moves that rearrange a Block without changing its colours, as
+# (action, direction) pairs
+REARRANGING_MOVES = [('rotate', 1), ('rotate', 3), ('swap', 0), ('swap', 1)]
+
+
+class _Tree:
+    """The state shared by all the Blocks in one tree, which is kept by the
+    root of the tree.
+
+    === Public Attributes ===
+    max_depth:
+        The deepest level allowed in the tree.
+    revision:
+        The number of moves that have been made on the tree.
+    grid:
+        The colour-index grid of the whole tree, or None if it has not been
+        built yet.
+    leaves:
+        The undivided Block covering each unit cell of the tree, indexed like
+        grid, or None if the table has not been built yet.
+    levels:
+        The level of the undivided Block covering each unit cell of the tree,
+        built and kept up to date together with leaves.
+    highlights:
+        The Blocks in the tree that are highlighted.
+    bitboards:
+        The revision at which the bitboards of the tree were last built, and
+        the bitboards, or None if they have not been built yet.
+    zobrist:
+        The Zobrist hashes of the grid under the eight symmetries of the
+        board, or None if they have not been worked out yet.  Once worked
+        out, they are kept up to date by every move.
+    damage:
+        The Blocks that moves or highlighting have changed since the tree was
+        last drawn, or None if the whole tree must be drawn again.
+    layout:
+        A token that is replaced whenever a move or a new root position or
+        size changes where the blocks of the tree are drawn.  A Block's
+        position and size are up to date iff they were computed under the
+        current token.
+    """
+    __slots__ = ('max_depth', 'revision', 'grid', 'leaves', 'levels',
+                 'highlights', 'bitboards', 'zobrist', 'damage', 'layout')
+    max_depth: int
+    revision: int
+    grid: Optional[np.ndarray]
+    leaves: Optional[np.ndarray]
+    levels: Optional[np.ndarray]
+    highlights: List['Block']
+    bitboards: Optional[Tuple[int, List[int]]]
+    zobrist: Optional[np.ndarray]
+    damage: Optional[List['Block']]
+    layout: object
+
+    def __init__(self, max_depth: int) -> None:
+        """Initialize the state of a tree of depth <max_depth> on which no
+        moves have been made.
+        """
+        self.max_depth = max_depth
+        self.revision = 0
+        self.grid = None
+        self.leaves = None
+        self.levels = None
+        self.highlights = []
+        self.bitboards = None
+        self.zobrist = None
+        self.damage = None
+        self.layout = object()
+
+    def add_damage(self, block: 'Block') -> None:
+        """Record that <block> must be drawn again.
+        """
+        if self.damage is not None:
+            if len(self.damage) < DAMAGE_LIMIT:
+                self.damage.append(block)
+            else:
+                self.damage = None
+
 
 class Block:
     """A square block in the Blocky game.
@@ -29,17 +119,24 @@ class Block:
     size:
         The height and width of this Block.  Since all blocks are square,
         we needn't represent height and width separately.
+        The position and size of a Block that is not the root are worked
+        out from those of the root when they are read, and are then kept
+        until a move changes the layout of the tree.
     colour:
         If this block is not subdivided, <colour> stores its colour.
         Otherwise, <colour> is None and this block's sublocks store their
         individual colours.
+    colour_index:
+        The index of <colour> in COLOUR_LIST, or None if <colour> is None.
+        This is how the colour is stored; <colour> is looked up from it.
     level:
         The level of this block within the overall block structure.
         The outermost block, corresponding to the root of the tree,
         is at level zero.  If a block is at level i, its children are at
         level i+1.
     max_depth:
-        The deepest level allowed in the overall block structure.
+        The deepest level allowed in the overall block structure.  It is
+        kept only by the root, so reading it walks up the tree.
     highlighted:
         True iff the user has selected this block for action.
     children:
@@ -47,7 +144,33 @@ class Block:
         stored in this order: upper-right child, upper-left child,
         lower-left child, lower-right child.
     parent:
-        The block that this block is directly within.
+        The block that this block is directly within, or None if this
+        block is the root of the tree.
+    revision:
+        The number of moves that have been made on the tree this Block is
+        in.  Like max_depth, it is kept only by the root.
+    grid:
+        The unit cells of this Block as an array of indices into COLOUR_LIST,
+        indexed in the same [column][row] order as flatten.  The grid is
+        built once for the whole tree, the first time it is read, and is
+        then kept up to date by swap, rotate and smash.  The grid of a block
+        that is not the root is a view into the grid of the root.  It is
+        read-only, as writing to it would not change the tree.
+    zobrist:
+        The Zobrist hash of the colours of the whole tree this Block is in.
+        See the zobrist module.  Like revision, it is kept only by the
+        root, and it is updated by each move in time proportional to the
+        number of unit cells the move changes.
+    canonical_zobrist:
+        The smallest of the Zobrist hashes of the tree this Block is in and
+        of its rotations and reflections, which is the same for all of them.
+    histogram:
+        The number of unit cells of each colour in this Block, indexed like
+        COLOUR_LIST.  It is counted once, from the histograms of the
+        children, the first time it is read, and is then kept until a smash
+        or a new colour changes it.  Rotating or swapping never does.
+    uniform:
+        True iff every unit cell of this Block has the same colour.
 
     === Representation Invariations ===
     - len(children) == 0 or len(children) == 4
@@ -63,14 +186,57 @@ class Block:
     - level <= max_depth
     """
 
-    position: Tuple[int, int]
-    size: int
-    colour: Optional[Tuple[int, int, int]]
+    # === Private Attributes ===
+    # _tree:
+    #     The state shared by the whole tree if this Block is a root, or None
+    #     if this Block is not a root or none of the state has been set yet.
+    # _flat:
+    #     The columns returned by flatten, as tuples, or None if they have not
+    #     been computed since this Block last changed.
+    # _children:
+    #     The children of this Block before the pending turns are applied.
+    # _turns:
+    #     The number of clockwise quarter turns that have been applied to
+    #     this Block but not yet to its children.  Rotating a Block only adds
+    #     to this count; the turns are passed down to the children the next
+    #     time they are read.
+    # _position:
+    #     The position of this Block, as last computed.
+    # _size:
+    #     The size of this Block, as last computed.
+    # _highlighted:
+    #     True iff this Block has been selected for action.
+    # _histogram:
+    #     The histogram of this Block, as last counted, or None if it has
+    #     not been counted since this Block last changed.
+    # _layout:
+    #     The layout token of the tree under which _position and _size were
+    #     computed, or None if they never have been.  It is not used by the
+    #     root, whose position and size are always up to date.
+    #
+    # == Representation Invariants concerning the private attributes ==
+    #     0 <= _turns < 4
+    #     _turns == 0 if _flat is not None
+    #     If _histogram is not None, neither is the _histogram of any of
+    #     this Block's children
+
+    # A tree can have tens of thousands of Blocks, so they have no __dict__.
+    __slots__ = ('colour_index', 'level', 'parent', '_tree', '_flat',
+                 '_children', '_turns', '_position', '_size', '_highlighted',
+                 '_layout', '_histogram')
+
+    colour_index: Optional[int]
     level: int
-    max_depth: int
-    highlighted: bool
-    children: List['Block']
     parent: Optional['Block']
+    _tree: Optional[_Tree]
+    _flat: Optional[Tuple[Tuple[Tuple[int, int, int], ...], ...]]
+    _children: List['Block']
+    _turns: int
+    _position: Tuple[int, int]
+    _size: int
+    _highlighted: bool
+    _layout: Optional[object]
+    _histogram: Optional[Tuple[int, ...]]
 
     def __init__(self, level: int,
                  colour: Optional[Tuple[int, int, int]] = None,
@@ -85,7 +251,7 @@ class Block:
         appropriate.)
         """
         self.level = level
-        self.colour = colour
+        self.colour_index = None if colour is None else colour_index(colour)
 
         if children is None:
             # self.children is NEVER None
@@ -93,18 +259,241 @@ class Block:
         else:
             self.children = children
 
-        self.position = (0, 0)
-        self.size = 0
-        self.max_depth = 0
+        self._position = (0, 0)
+        self._size = 0
+        self._layout = None
 
-        self.highlighted = False
+        self._highlighted = False
 
+        self.parent = None
+        self._tree = None
+        self._flat = None
+        self._histogram = None
         self.set_childrens_parent()
 
-    def rectangles_to_draw(self) -> List[Tuple[Tuple[int, int, int],
-                                               Tuple[int, int],
-                                               Tuple[int, int],
-                                               int]]:
+    @property
+    def children(self) -> List['Block']:
+        """The children of this Block.  See the class docstring.
+        """
+        if self._turns:
+            self._apply_turns()
+        return self._children
+
+    @children.setter
+    def children(self, children: List['Block']) -> None:
+        """Replace the children of this Block with <children>.
+        """
+        self._children = children
+        self._turns = 0
+
+    def _apply_turns(self) -> None:
+        """Apply the pending turns of this Block to the order of its
+        children, and pass them down to be applied to the children's own
+        children later.
+        """
+        turns = self._turns
+        self._turns = 0
+        self._children = rotate_list(self._children, -turns)
+        for child in self._children:
+            if child._children:
+                child._turns = (child._turns + turns) % 4
+                child._flat = None
+
+    def _apply_ancestor_turns(self) -> List['Block']:
+        """Pass down to this Block the turns still pending on its ancestors,
+        so that it and its children are where the board shows them, and
+        return its ancestors from the root down.
+
+        The turns are applied from the root down, as reading the children on
+        the way down from the root would.  Reading them from this Block up
+        would find a Block's place in its parent before the turns of the
+        parent's own ancestors had reached the parent.
+        """
+        ancestors = []
+        block = self.parent
+        while block is not None:
+            ancestors.append(block)
+            block = block.parent
+        ancestors.reverse()
+        for block in ancestors:
+            if block._turns:
+                block._apply_turns()
+        return ancestors
+
+    @property
+    def colour(self) -> Optional[Tuple[int, int, int]]:
+        """The colour of this Block.  See the class docstring.
+        """
+        if self.colour_index is None:
+            return None
+        return COLOUR_LIST[self.colour_index]
+
+    @colour.setter
+    def colour(self, colour: Optional[Tuple[int, int, int]]) -> None:
+        """Set the colour of this Block to <colour>.
+
+        If this Block is undivided, its cells are repainted, and the grid,
+        caches and revision of the tree are brought up to date as after a
+        move.
+        """
+        self.colour_index = None if colour is None else colour_index(colour)
+        if not self._children:
+            self._invalidate_histogram()
+            self._record_move('paint', 0)
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """The position of this Block.  See the class docstring.
+        """
+        self._place()
+        return self._position
+
+    @position.setter
+    def position(self, position: Tuple[int, int]) -> None:
+        """Move this Block so that its upper left corner is at <position>.
+        """
+        self._set_geometry(position, self.size)
+
+    @property
+    def size(self) -> int:
+        """The size of this Block.  See the class docstring.
+        """
+        self._place()
+        return self._size
+
+    @size.setter
+    def size(self, size: int) -> None:
+        """Set the height and width of this Block to <size>.
+        """
+        self._set_geometry(self.position, size)
+
+    def _set_geometry(self, position: Tuple[int, int], size: int) -> None:
+        """Set the position and size of this Block, so that the Blocks within
+        it are laid out from them when they are next read.
+
+        A Block that is not the root keeps the given position and size only
+        until its parent's children are next laid out.
+        """
+        tree = self._tree_state()
+        tree.layout = object()
+        tree.damage = None
+        self._position = position
+        self._size = size
+        self._layout = tree.layout
+
+    def _place(self) -> object:
+        """Bring the position and size of this Block up to date, and return
+        the layout token of its tree.
+
+        Only the ancestors of this Block whose positions are out of date are
+        laid out, so this takes time proportional to the level of this Block.
+        """
+        if self.parent is None:
+            return self._tree_state().layout
+        layout = self.parent._place()
+        if self._layout is not layout:
+            self.parent._place_children(layout)
+        return layout
+
+    def _place_children(self, layout: object) -> None:
+        """Set the position and size of each child of this Block from this
+        Block's own, which are up to date under the layout token <layout>.
+        """
+        x, y = self._position
+        half = self._size // 2
+        child_size = round(self._size / 2.0)
+        for child, (dx, dy) in zip(self.children, QUADRANT_OFFSETS):
+            child._position = (x + dx * half, y + dy * half)
+            child._size = child_size
+            child._layout = layout
+
+    @property
+    def highlighted(self) -> bool:
+        """Whether this Block is highlighted.  See the class docstring.
+        """
+        return self._highlighted
+
+    @highlighted.setter
+    def highlighted(self, highlighted: bool) -> None:
+        """Highlight this Block iff <highlighted> is True.
+        """
+        if highlighted != self._highlighted:
+            self._highlighted = highlighted
+            tree = self._tree_state()
+            tree.add_damage(self)
+            if highlighted:
+                tree.highlights.append(self)
+            elif self in tree.highlights:
+                tree.highlights.remove(self)
+
+    def highlighted_blocks(self) -> List['Block']:
+        """Return the highlighted Blocks in the tree this Block is in.
+        """
+        blocks = []
+        for block in self._tree_state().highlights:
+            # Skip Blocks that were highlighted when an ancestor was smashed.
+            node = block
+            while node.parent is not None and node in node.parent._children:
+                node = node.parent
+            if node.parent is None:
+                blocks.append(block)
+        return blocks
+
+    def pop_damage(self) -> Optional[List[Tuple[int, int, int, int]]]:
+        """Return the (x, y, width, height) of each area of the screen that
+        has changed since this was last called on the tree this Block is in,
+        and forget them.
+
+        Return None if the whole tree must be drawn again, as it must be the
+        first time, or after the position or size of the root has changed.
+        """
+        tree = self._tree_state()
+        damage = tree.damage
+        tree.damage = []
+        if damage is None:
+            return None
+        areas = []
+        for block in dict.fromkeys(damage):
+            x, y = block.position
+            areas.append((x, y, block.size, block.size))
+        return areas
+
+    @property
+    def max_depth(self) -> int:
+        """The max depth of the tree this Block is in.  See the class
+        docstring.
+        """
+        return self._tree_state().max_depth
+
+    @max_depth.setter
+    def max_depth(self, max_depth: int) -> None:
+        """Set the max depth of the tree this Block is in to <max_depth>.
+        """
+        self._tree_state().max_depth = max_depth
+
+    @property
+    def revision(self) -> int:
+        """The number of moves made on the tree this Block is in.  See the
+        class docstring.
+        """
+        return self._tree_state().revision
+
+    def _tree_state(self) -> _Tree:
+        """Return the state shared by the tree this Block is in, creating it
+        if it has not been set yet.
+        """
+        block = self
+        while block.parent is not None:
+            block = block.parent
+        if block._tree is None:
+            block._tree = _Tree(0)
+        return block._tree
+
+    def rectangles_to_draw(self, area: Optional[Tuple[int, int, int, int]]
+                           = None) -> List[Tuple[Tuple[int, int, int],
+                                                 Tuple[int, int],
+                                                 Tuple[int, int],
+                                                 int]]:
         """
         Return a list of tuples describing all of the rectangles to be drawn
         in order to render this Block.
@@ -130,23 +519,67 @@ class Block:
           the outline.
 
         The order of the rectangles does not matter.
-        """
-        list_return = []
-
-        if self.highlighted:
-            list_return.append(
-                (HIGHLIGHT_COLOUR, self.position, (self.size, self.size), 5))
 
-        if len(self.children) == 0:
-            list_return.append(
-                (self.colour, self.position, (self.size, self.size), 0))
-            list_return.append(
-                (FRAME_COLOUR, self.position, (self.size, self.size), 3))
-
-        else:
-            for block in self.children:
-                list_return.extend(block.rectangles_to_draw())
-        return list_return
+        If <area> is given, as the (x, y, width, height) of an area of the
+        screen, only the Blocks that overlap it are visited, and only their
+        rectangles are returned.
+        """
+        return list(self.iter_rectangles(area))
+
+    def iter_rectangles(self, area: Optional[Tuple[int, int, int, int]] = None,
+                        highlights_last: bool = False, min_size: int = 0) \
+            -> Iterator[Tuple[Tuple[int, int, int], Tuple[int, int],
+                              Tuple[int, int], int]]:
+        """Yield the rectangles to draw this Block one at a time, in a single
+        walk of the tree, as rectangles_to_draw returns them.
+
+        <area> is as for rectangles_to_draw.  If <highlights_last> is True,
+        the rectangles that frame highlighted Blocks are yielded after all the
+        others, so that they are drawn on top.
+
+        Blocks smaller than <min_size> pixels are drawn as one filled cell,
+        without a frame, in the colour of their upper-left unit cell, and the
+        Blocks within them are not visited.  This keeps the number of
+        rectangles to the detail that can be seen on deep boards.
+        """
+        layout = self._place()
+        highlights = []
+        stack = [self]
+        while stack:
+            block = stack.pop()
+            position = block._position
+            size = block._size
+            if area is not None and not (
+                    position[0] < area[0] + area[2] and
+                    area[0] < position[0] + size and
+                    position[1] < area[1] + area[3] and
+                    area[1] < position[1] + size):
+                continue
+            dimensions = (size, size)
+
+            if block._highlighted:
+                rectangle = (HIGHLIGHT_COLOUR, position, dimensions, 5)
+                if highlights_last:
+                    highlights.append(rectangle)
+                else:
+                    yield rectangle
+
+            if size < min_size:
+                leaf = block
+                while leaf.children:
+                    leaf = leaf.children[1]
+                yield leaf.colour, position, dimensions, 0
+
+            elif len(block.children) == 0:
+                yield block.colour, position, dimensions, 0
+                yield FRAME_COLOUR, position, dimensions, 3
+
+            else:
+                # The children are laid out from this Block on the way down,
+                # and pushed in reverse so that they are visited in order.
+                block._place_children(layout)
+                stack.extend(reversed(block.children))
+        yield from highlights
 
     def swap(self, direction: int) -> None:
         """Swap the child Blocks of this Block.
@@ -154,7 +587,10 @@ class Block:
         If <direction> is 1, swap vertically.  If <direction> is 0, swap
         horizontally. If this Block has no children, do nothing.
         """
-        if len(self.children) == 4:
+        if len(self._children) == 4:
+            # A rotation of an ancestor may not have reached this Block yet,
+            # and the halves swapped are those the board shows.
+            self._apply_ancestor_turns()
             child0 = self.children[0]
             child1 = self.children[1]
             child2 = self.children[2]
@@ -165,23 +601,23 @@ class Block:
             elif direction == 0:
                 self.children = [child1, child0, child3, child2]
 
-        self.update_block_locations(self.position, self.size)
+            self._record_move('swap', direction)
 
     def rotate(self, direction: int) -> None:
         """Rotate this Block and all its descendants.
 
         If <direction> is 1, rotate clockwise.  If <direction> is 3, rotate
         counterclockwise. If this Block has no children, do nothing.
-        """
-        if len(self.children) == 4:
-            self.children = rotate_list(self.children, direction - 2)
 
-            for child in self.children:
-                child.rotate(direction)
+        Only this Block's count of pending turns changes; each descendant is
+        turned when its children are next read.
+        """
+        if len(self._children) == 4:
+            self._turns = (self._turns + (1 if direction == 1 else 3)) % 4
 
-        self.update_block_locations(self.position, self.size)
+            self._record_move('rotate', direction)
 
-    def smash(self) -> bool:
+    def smash(self, children: Optional[List['Block']] = None) -> bool:
         """Smash this block.
 
         If this Block can be smashed,
@@ -189,26 +625,79 @@ class Block:
         had child Blocks, discard them.)
         Ensure that the RI's of the Blocks remain satisfied.
 
+        If <children> is not None, use them as the four new child Blocks
+        instead of generating random ones.  This lets a smash be generated
+        ahead of time, for example to score it with Goal.score_move.
+
         A Block can be smashed <==> it is not the top-level Block and it
         is not already at the level of the maximum depth.
 
         Return True if this Block was smashed and False otherwise.
         """
-        if self.level == self.max_depth or self.level == 0:
+        if self.level == 0 or self.level == self.max_depth:
             return False
 
         else:
-            self.children = \
-                [random_init(self.level + 1, self.max_depth) for _ in range(4)]
+            if children is None:
+                children = self.smashed_children()
+            # The new children are painted as they are given, so no rotation
+            # of an ancestor may reach them afterwards.
+            self._apply_ancestor_turns()
+            self.children = children
             self.set_childrens_parent()
-            self.update_block_locations(self.position, self.size)
+            self._invalidate_histogram()
+            self._record_move('smash', 0)
             return True
 
+    def smashed_children(self) -> List['Block']:
+        """Return four new randomly-generated Blocks that could replace the
+        children of this Block when it is smashed.
+        """
+        return [random_init(self.level + 1, self.max_depth) for _ in range(4)]
+
+    def _record_move(self, action: str, direction: int) -> None:
+        """Bring the grid, caches and revision of this tree up to date after
+        this Block has been rotated, swapped or smashed, or, if it is
+        undivided, painted a new colour.
+
+        <action> is 'rotate', 'swap', 'smash' or 'paint', and <direction> is
+        the direction the move was made in.
+        """
+        tree, column, row, span = self._locate()
+        if tree.grid is not None:
+            region = tree.grid[column:column + span, row:row + span]
+            if tree.zobrist is not None:
+                tree.zobrist = tree.zobrist ^ \
+                    self._region_hashes(region, column, row)
+            if action in ('smash', 'paint'):
+                self._paint(region)
+            else:
+                region[...] = transform_region(region, action, direction)
+            if tree.zobrist is not None:
+                tree.zobrist = tree.zobrist ^ \
+                    self._region_hashes(region, column, row)
+        if tree.leaves is not None:
+            region = tree.leaves[column:column + span, row:row + span]
+            levels = tree.levels[column:column + span, row:row + span]
+            if action in ('smash', 'paint'):
+                self._paint_leaves(region, levels)
+            else:
+                region[...] = transform_region(region, action, direction)
+                levels[...] = transform_region(levels, action, direction)
+        tree.revision += 1
+        tree.add_damage(self)
+        # The positions of the Blocks within this one are now out of date.
+        tree.layout = object()
+        self._invalidate()
+
     def set_childrens_parent(self):
         """Set the parent attribute
         of each child of self block"""
         for child in self.children:
             child.parent = self
+            # The children are no longer roots, so they share this tree's
+            # state from now on.
+            child._tree = None
 
     def update_block_locations(self, top_left: Tuple[int, int],
                                size: int) -> None:
@@ -220,25 +709,12 @@ class Block:
 
         <top_left> is the (x, y) coordinates of the top left corner of
         this Block.  <size> is the height and width of this Block.
-        """
-        self.size = size
-
-        if self.children is not None and len(self.children) == 4:
-            self.children[1].position = top_left
-            self.children[1].size = round(size / 2.0)
 
-            self.children[0].position = (top_left[0] + size // 2, top_left[1])
-            self.children[0].size = round(size / 2.0)
-
-            self.children[2].position = (top_left[0], top_left[1] + size // 2)
-            self.children[2].size = round(size / 2.0)
-
-            self.children[3].position = (
-                top_left[0] + size // 2, top_left[1] + size // 2)
-            self.children[3].size = round(size / 2.0)
-
-            for block in self.children:
-                block.update_block_locations(block.position, block.size)
+        This takes constant time: the positions and sizes of the Blocks
+        within this Block are computed from <top_left> and <size> when they
+        are next read.
+        """
+        self._set_geometry(top_left, size)
 
     def get_selected_block(self, location: Tuple[int, int], level: int) \
             -> 'Block':
@@ -257,20 +733,77 @@ class Block:
         Preconditions:
         - 0 <= level <= max_depth
         """
-
-        if location not in self:
+        x, y = location
+        left, top = self.position
+        size = self.size
+        if not (left <= x <= left + size and top <= y <= top + size):
             return self
 
-        if level == self.level or (
-                level > self.level and len(self.children) == 0):
-            return self
-        else:
-            for i in range(4):
-                # uses custom dunder method __contains__
-                if location in self.children[i]:
-                    return self.children[i].get_selected_block(location,
-                                                               level)
-            return self
+        # Work out which child holds the location from the coordinates
+        # alone.  The bounds of the children include their far edges, so
+        # they overlap; where they do, the first child in the order
+        # upper-right, upper-left, lower-left, lower-right is chosen.
+        block = self
+        while block.level != level and block._children:
+            half = size // 2
+            child_size = round(size / 2.0)
+            x_offset = x - left
+            y_offset = y - top
+            in_left = x_offset <= child_size
+            in_right = half <= x_offset <= half + child_size
+            if y_offset <= child_size:
+                i = 0 if in_right else 1 if in_left else None
+            elif y_offset <= half + child_size:
+                i = 2 if in_left else 3 if in_right else None
+            else:
+                i = None
+            if i is None:
+                break
+            dx, dy = QUADRANT_OFFSETS[i]
+            left += dx * half
+            top += dy * half
+            size = child_size
+            block = block.children[i]
+        return block
+
+    def leaf_at(self, column: int, row: int) -> 'Block':
+        """Return the undivided Block that covers the unit cell at <column>
+        and <row> of this Block, counted in unit cells from its upper left
+        corner.
+
+        The cell-to-leaf table this reads is built for the whole tree the
+        first time it is needed, and is then kept up to date by swap, rotate
+        and smash like the grid, so each call takes constant time.
+        """
+        tree, left, top, _ = self._leaf_tables()
+        return tree.leaves[left + column, top + row]
+
+    @property
+    def leaf_levels(self) -> np.ndarray:
+        """The level of the undivided Block covering each unit cell of this
+        Block, as a read-only array indexed like grid.
+
+        Like leaf_at, this reads a table that is kept up to date by moves.
+        """
+        tree, left, top, span = self._leaf_tables()
+        levels = tree.levels[left:left + span, top:top + span]
+        levels.flags.writeable = False
+        return levels
+
+    def _leaf_tables(self) -> Tuple[_Tree, int, int, int]:
+        """Build the cell-to-leaf and level tables of this tree if they have
+        not been built yet, and return what _locate returns.
+        """
+        tree, left, top, span = self._locate()
+        if tree.leaves is None:
+            width = 2 ** tree.max_depth
+            tree.leaves = np.empty((width, width), dtype=object)
+            tree.levels = np.empty((width, width), dtype=np.uint8)
+            root = self
+            while root.parent is not None:
+                root = root.parent
+            root._paint_leaves(tree.leaves, tree.levels)
+        return tree, left, top, span
 
     def __contains__(self, loc: Tuple[int, int]) -> bool:
         """Returns whether the <loc> is within the
@@ -297,38 +830,405 @@ class Block:
 
         L[0][0] represents the unit cell in the upper left corner of the Block.
         """
-        if not self.children:  # checks if empty
-            offset = self.max_depth - self.level
-            split = 2 ** offset
-
-            out = []
-            for _ in range(split):
-                inner = []
-                for __ in range(split):
-                    inner.append(self.colour)
-                out.append(inner)
-            return out
-        else:
-            flat_children = [child.flatten() for child in self.children]
-            child0_3 = flat_children[0]
-            child1_2 = flat_children[1]
+        _, _, _, span = self._locate()
+        return [list(column) for column in self._flattened(span)]
 
-            # Blocks should all have same number of columns so one loop works
-            for i in range(len(flat_children[1])):
-                child1_2[i].extend(flat_children[2][i])
-                child0_3[i].extend(flat_children[3][i])
+    def _flattened(self, span: int) \
+            -> Tuple[Tuple[Tuple[int, int, int], ...], ...]:
+        """Return the columns of unit cells of this Block, as in flatten,
+        but as tuples that are cached until this Block changes.
 
-            child1_2.extend(child0_3)
-            return child1_2
+        <span> is the width of this Block in unit cells.
+        """
+        if self._flat is None:
+            if not self.children:  # checks if empty
+                column = (self.colour,) * span
+                self._flat = (column,) * span
+            else:
+                flat_children = [child._flattened(span // 2)
+                                 for child in self.children]
+
+                # Blocks should all have same number of columns so one zip
+                # works; left columns come from children 1 and 2, right
+                # columns from children 0 and 3
+                self._flat = \
+                    tuple(upper + lower for upper, lower in
+                          zip(flat_children[1], flat_children[2])) + \
+                    tuple(upper + lower for upper, lower in
+                          zip(flat_children[0], flat_children[3]))
+        return self._flat
+
+    def _invalidate(self) -> None:
+        """Discard the cached flattened form of this Block and its ancestors.
+
+        A Block's cache can only be set if its children's caches are, so the
+        walk up the tree stops at the first ancestor that has no cache.
+        """
+        self._flat = None
+        block = self.parent
+        while block is not None and block._flat is not None:
+            block._flat = None
+            block = block.parent
+
+    @property
+    def histogram(self) -> Tuple[int, ...]:
+        """The number of unit cells of each colour in this Block.  See the
+        class docstring.
+        """
+        if self._histogram is None:
+            self._counted(2 ** (self.max_depth - self.level))
+        return self._histogram
+
+    @property
+    def uniform(self) -> bool:
+        """True iff this Block is all one colour.  See the class docstring.
+        """
+        return self.histogram.count(0) == len(COLOUR_LIST) - 1
+
+    def _counted(self, span: int) -> Tuple[int, ...]:
+        """Return the histogram of this Block, which is <span> unit cells
+        wide, counting it and the histograms of the Blocks within it if they
+        have not been counted yet.
+        """
+        if self._histogram is None:
+            if not self._children:
+                counts = [0] * len(COLOUR_LIST)
+                counts[self.colour_index] = span * span
+                self._histogram = tuple(counts)
+            else:
+                # The pending turns do not change the counts, so the children
+                # are read without applying them.
+                self._histogram = tuple(map(sum, zip(*(
+                    child._counted(span // 2) for child in self._children))))
+        return self._histogram
+
+    def _invalidate_histogram(self) -> None:
+        """Discard the histogram of this Block and its ancestors.
+
+        As with _invalidate, the walk up the tree stops at the first ancestor
+        that has no histogram.
+        """
+        self._histogram = None
+        block = self.parent
+        while block is not None and block._histogram is not None:
+            block._histogram = None
+            block = block.parent
+
+    @property
+    def grid(self) -> np.ndarray:
+        """The colour-index grid of this Block.  See the class docstring.
+        """
+        tree, column, row, span = self._locate()
+        if tree.grid is None:
+            width = 2 ** tree.max_depth
+            tree.grid = np.empty((width, width), dtype=np.uint8)
+            root = self
+            while root.parent is not None:
+                root = root.parent
+            root._paint(tree.grid)
+        grid = tree.grid[column:column + span, row:row + span]
+        grid.flags.writeable = False
+        return grid
+
+    @property
+    def bitboards(self) -> List[int]:
+        """The unit cells of this Block as one bitboard per colour, indexed
+        like COLOUR_LIST.  See the bitboard module.
+
+        The bitboards of a whole tree are kept until the next move on it.
+        """
+        if self.parent is not None:
+            return bitboards(self.grid, len(COLOUR_LIST))
+        tree = self._tree_state()
+        if tree.bitboards is None or tree.bitboards[0] != tree.revision:
+            tree.bitboards = (tree.revision,
+                              bitboards(self.grid, len(COLOUR_LIST)))
+        return tree.bitboards[1]
+
+    @property
+    def zobrist(self) -> int:
+        """The Zobrist hash of the tree this Block is in.  See the class
+        docstring.
+        """
+        return int(self.zobrist_hashes()[0])
+
+    @property
+    def canonical_zobrist(self) -> int:
+        """The canonical Zobrist hash of the tree this Block is in.  See the
+        class docstring.
+        """
+        return int(self.zobrist_hashes().min())
+
+    def zobrist_hashes(self) -> np.ndarray:
+        """Return the Zobrist hashes of the tree this Block is in under the
+        eight symmetries of the board, as zobrist.zobrist_hashes does.
+
+        The array returned must not be mutated.
+        """
+        tree = self._tree_state()
+        if tree.zobrist is None:
+            root = self
+            while root.parent is not None:
+                root = root.parent
+            tree.zobrist = self._region_hashes(root.grid, 0, 0)
+        return tree.zobrist
+
+    def zobrist_after(self, action: str, direction: int = 0,
+                      children: Optional[List['Block']] = None) -> int:
+        """Return the Zobrist hash of the tree this Block is in as it would
+        be after a move on this Block, without making the move.
+
+        The arguments are as for grid_after.
+        """
+        return int(self._hashes_after(action, direction, children)[0])
+
+    def canonical_zobrist_after(self, action: str, direction: int = 0,
+                                children: Optional[List['Block']] = None) \
+            -> int:
+        """Return the canonical Zobrist hash of the tree this Block is in
+        as it would be after a move on this Block, without making the move.
+
+        The arguments are as for grid_after.
+        """
+        return int(self._hashes_after(action, direction, children).min())
+
+    def _hashes_after(self, action: str, direction: int,
+                      children: Optional[List['Block']]) -> np.ndarray:
+        """Return the Zobrist hashes of the tree this Block is in under the
+        eight symmetries of the board, as they would be after a move on this
+        Block.
+        """
+        column, row, _ = self.cell_bounds()
+        return self.zobrist_hashes() ^ \
+            self._region_hashes(self.grid, column, row) ^ \
+            self._region_hashes(self.grid_after(action, direction, children),
+                                column, row)
+
+    def _region_hashes(self, region: np.ndarray, column: int, row: int) \
+            -> np.ndarray:
+        """Return the Zobrist hashes of the cells in <region>, a part of the
+        grid of this Block's tree with its upper left cell at (<column>,
+        <row>), under the eight symmetries of the board.
+        """
+        return zobrist_hashes(region, column, row, 2 ** self.max_depth,
+                              len(COLOUR_LIST))
+
+    def grid_after(self, action: str, direction: int = 0,
+                   children: Optional[List['Block']] = None) -> np.ndarray:
+        """Return the grid of this Block as it would be after a move, without
+        making the move.
+
+        <action> is 'rotate', 'swap' or 'smash', and <direction> is the
+        direction of a rotation or swap.  The grid after a smash is the grid
+        of the given new <children>.
+        """
+        if action == 'smash':
+            region = np.empty_like(self.grid)
+            half = len(region) // 2
+            for child, (dx, dy) in zip(children, QUADRANT_OFFSETS):
+                child._paint(region[dx * half:(dx + 1) * half,
+                                    dy * half:(dy + 1) * half])
+            return region
+        return transform_region(self.grid, action, direction)
+
+    def iter_moves(self, moves: Optional[List[Tuple[str, int]]] = None,
+                   colour: Optional[int] = None, canonical: bool = False) \
+            -> Iterator[Tuple['Block', str, int]]:
+        """Yield each distinct move on this Block and the Blocks within it
+        as a (block, action, direction) tuple, without making any of them.
+
+        <moves> are the rotations and swaps to try on each Block, as
+        (action, direction) pairs, and are REARRANGING_MOVES if None.
+        Smashing is random, so it is never tried.  A move is skipped if it
+        would leave the colours of the board as they are, such as rotating a
+        Block of one colour, or if it would give the same board as a move
+        already yielded on the same Block, such as rotating both ways a Block
+        that looks the same upside down.  Blocks of one colour are passed
+        over, with the Blocks within them, without reading their grids.
+
+        If <colour> is given, as an index into COLOUR_LIST, a move is also
+        skipped if it would leave the cells of that colour where they are,
+        so that Blocks with none of that colour or only that colour are
+        passed over too.  Such a move cannot change the score of a goal for
+        the colour.
+
+        If <canonical> is True, a move is also skipped if the board after it
+        would be a rotation or reflection of the board as it is, or of the
+        board after a move already yielded, as told by their canonical
+        Zobrist hashes.  No goal scores such boards differently.  Rotating
+        the root Block is always skipped this way.  Swapping it is not, since
+        a swap moves the children without mirroring them.
+
+        Blocks are visited from the largest down, and the moves are found as
+        they are asked for, so the caller can stop at any point.  The tree
+        must not be changed until the caller has finished with the moves.
+        """
+        if moves is None:
+            moves = REARRANGING_MOVES
+        # The canonical hashes of the board and of the boards after the moves
+        # yielded so far
+        boards = {self.canonical_zobrist} if canonical else set()
+        stack = [self]
+        while stack:
+            block = stack.pop()
+            if block.uniform:
+                # A move on a Block of one colour never changes anything.
+                continue
+            region = block.grid
+            if canonical:
+                column, row, _ = block.cell_bounds()
+                without = self.zobrist_hashes() ^ \
+                    self._region_hashes(region, column, row)
+            if colour is not None:
+                count = block.histogram[colour]
+                if count == 0 or count == region.size:
+                    continue
+                region = region == colour
+            seen = {region.tobytes()}
+            for action, direction in moves:
+                after = transform_region(region, action, direction).tobytes()
+                if after in seen:
+                    continue
+                seen.add(after)
+                if canonical:
+                    key = int((without ^ self._region_hashes(
+                        transform_region(block.grid, action, direction),
+                        column, row)).min())
+                    if key in boards:
+                        continue
+                    boards.add(key)
+                yield block, action, direction
+            stack.extend(reversed(block.children))
+
+    def cell_bounds(self) -> Tuple[int, int, int]:
+        """Return the (column, row) of the unit cell at the upper left corner
+        of this Block, and the width of this Block in unit cells.
+        """
+        _, column, row, span = self._locate()
+        return column, row, span
+
+    def path(self) -> List[int]:
+        """Return the indices of the children to follow from the root of the
+        tree to reach this Block.
+
+        The path identifies this Block's place in any copy of the tree.
+        """
+        ancestors = self._apply_ancestor_turns()
+        return [parent.children.index(child) for parent, child in
+                zip(ancestors, ancestors[1:] + [self])]
+
+    def descendant(self, path: List[int]) -> 'Block':
+        """Return the Block reached by following the child indices in <path>
+        from this Block.
+        """
+        block = self
+        for i in path:
+            block = block.children[i]
+        return block
+
+    def _locate(self) -> Tuple[_Tree, int, int, int]:
+        """Return the state of the tree this Block is in, the (column, row)
+        of the unit cell at the upper left corner of this Block, and the
+        width of this Block in unit cells.
+        """
+        ancestors = self._apply_ancestor_turns()
+        root = ancestors[0] if ancestors else self
+        if root._tree is None:
+            root._tree = _Tree(0)
+
+        column, row = 0, 0
+        span = 2 ** root._tree.max_depth
+        for parent, child in zip(ancestors, ancestors[1:] + [self]):
+            i = parent.children.index(child)
+            span //= 2
+            dx, dy = QUADRANT_OFFSETS[i]
+            column += dx * span
+            row += dy * span
+        return root._tree, column, row, span
+
+    def _paint(self, out: np.ndarray) -> None:
+        """Write the colour index of every unit cell of this Block into <out>,
+        which has one entry per unit cell of this Block.
+        """
+        if len(self.children) == 0:
+            out[...] = self.colour_index
+        else:
+            half = len(out) // 2
+            for child, (dx, dy) in zip(self.children, QUADRANT_OFFSETS):
+                child._paint(out[dx * half:(dx + 1) * half,
+                                 dy * half:(dy + 1) * half])
+
+    def _paint_leaves(self, out: np.ndarray, levels: np.ndarray) -> None:
+        """Write the undivided Block covering every unit cell of this Block
+        into <out>, and its level into <levels>.  Each has one entry per unit
+        cell of this Block.
+        """
+        if len(self.children) == 0:
+            out[...] = self
+            levels[...] = self.level
+        else:
+            half = len(out) // 2
+            for child, (dx, dy) in zip(self.children, QUADRANT_OFFSETS):
+                quadrant = (slice(dx * half, (dx + 1) * half),
+                            slice(dy * half, (dy + 1) * half))
+                child._paint_leaves(out[quadrant], levels[quadrant])
 
     def set_max_depth(self, max_depth: int) -> "Block":
-        """Sets the max depth of the block to <max_depth>,
+        """Sets the max depth of the tree this block is in to <max_depth>,
         and returns itself
         """
         self.max_depth = max_depth
         return self
 
 
+def transform_region(region: np.ndarray, action: str,
+                     direction: int) -> np.ndarray:
+    """Return the grid <region> of a Block as it would be after the Block
+    is rotated or swapped.
+
+    <action> is 'rotate' or 'swap', and <direction> is interpreted as it is
+    by Block.rotate and Block.swap.  <region> is not mutated.
+    """
+    # These are what np.rot90 and np.roll return, built directly, as they
+    # are called for every move a player searches.
+    if action == 'rotate':
+        if direction == 1:
+            return region.T[::-1]
+        return region.T[:, ::-1]
+    # Swapping exchanges the halves of the region along one axis.
+    half = len(region) // 2
+    if direction == 0:
+        return np.concatenate((region[half:], region[:half]))
+    return np.concatenate((region[:, half:], region[:, :half]), axis=1)
+
+
+def apply_move(block: Block, action: str, direction: int = 0) -> None:
+    """Make the move <action> on <block>.
+
+    <action> is 'rotate', 'swap' or 'smash', and <direction> is the
+    direction of a rotation or swap.
+    """
+    if action == 'rotate':
+        block.rotate(direction)
+    elif action == 'swap':
+        block.swap(direction)
+    else:
+        block.smash()
+
+
+def undo_move(block: Block, action: str, direction: int = 0) -> None:
+    """Undo the move <action> made on <block> by apply_move.
+
+    <action> is 'rotate' or 'swap', and <direction> is the direction the
+    move was made in.  A smash cannot be undone.
+    """
+    if action == 'rotate':
+        block.rotate(3 if direction == 1 else 1)
+    else:
+        # Swapping twice in the same direction puts the children back.
+        block.swap(direction)
+
+
 def rotate_list(block_list: List["Block"], n: int) -> List["Block"]:
     """Non-mutating helper function to rotate a list,
     returns a rotated list that moves the 0th index up <n> elements
@@ -413,7 +1313,8 @@ if __name__ == '__main__':
         'allowed-io': ['print_block_indented'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing',
-            'block', 'goal', 'player', 'renderer', 'math'
+            'block', 'goal', 'player', 'renderer', 'math', 'numpy',
+            'bitboard', 'zobrist'
         ],
         'max-attributes': 15
     })
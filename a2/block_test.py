@@ -0,0 +1,376 @@
+import random
+import numpy as np
+from block import Block, REARRANGING_MOVES, apply_move, undo_move
+from renderer import COLOUR_LIST, BOARD_WIDTH, TEMPTING_TURQUOISE
+from testutil import all_blocks, random_board
+from zobrist import zobrist_hash
+
+
+def assert_grid_matches_flatten(board: Block) -> None:
+    """Assert that the colour-index grid of <board> agrees with flatten.
+    """
+    expected = [[COLOUR_LIST.index(colour) for colour in column]
+                for column in board.flatten()]
+    assert board.grid.tolist() == expected
+
+
+def test_grid_matches_flatten() -> None:
+    """The grid of a fresh board is the flattened board.
+    """
+    for seed in range(10):
+        assert_grid_matches_flatten(random_board(4, seed))
+
+
+def test_grid_follows_moves() -> None:
+    """The grid stays in sync with the tree through every kind of move.
+    """
+    board = random_board(4, 148)
+    board.grid
+    for _ in range(200):
+        block = random.choice(all_blocks(board))
+        move = random.randint(0, 4)
+        if move == 0:
+            block.rotate(1)
+        elif move == 1:
+            block.rotate(3)
+        elif move == 2:
+            block.swap(0)
+        elif move == 3:
+            block.swap(1)
+        else:
+            block.smash()
+        assert_grid_matches_flatten(board)
+
+
+def test_grid_of_child_is_view() -> None:
+    """The grid of a child block is its quadrant of the root's grid.
+    """
+    board = Block(0, children=[Block(1, COLOUR_LIST[i]) for i in range(4)])
+    board.set_max_depth(1)
+    for child in board.children:
+        child.set_max_depth(1)
+    assert board.grid.tolist() == [[1, 2], [0, 3]]
+    assert board.children[0].grid.tolist() == [[0]]
+    board.rotate(1)
+    assert board.grid.tolist() == [[2, 3], [1, 0]]
+
+
+def test_grid_is_read_only() -> None:
+    """The grid of a block cannot be written to, as that would not change
+    the tree.
+    """
+    board = random_board(3, 5)
+    for block in (board, board.children[0]):
+        try:
+            block.grid[0, 0] = 0
+        except ValueError:
+            pass
+        else:
+            assert False, 'the grid was written to'
+    assert_grid_matches_flatten(board)
+
+
+def test_flatten_cache_follows_moves() -> None:
+    """Cached flattened blocks are discarded when a move changes them.
+    """
+    board = random_board(4, 207)
+    for _ in range(100):
+        block = random.choice(all_blocks(board))
+        # Fill the caches of the block and of the whole board before moving.
+        block.flatten()
+        board.flatten()
+        block.rotate(random.choice([1, 3]))
+        block.swap(random.randint(0, 1))
+        if random.random() < 0.1:
+            block.smash()
+        assert_grid_matches_flatten(board)
+
+
+def test_flatten_result_is_a_copy() -> None:
+    """Mutating the result of flatten does not corrupt the cache.
+    """
+    board = random_board(3, 4)
+    flattened = board.flatten()
+    flattened[0][0] = None
+    assert board.flatten()[0][0] is not None
+
+
+def test_moves_on_blocks_held_across_rotations() -> None:
+    """Moves on Blocks found before one of their ancestors was rotated are
+    made where the Blocks are now.
+    """
+    board = random_board(4, 311)
+    blocks = all_blocks(board)
+    assert_grid_matches_flatten(board)
+    for _ in range(200):
+        block = random.choice(blocks)
+        ancestor = block.parent
+        while ancestor is not None and ancestor.parent is not None \
+                and random.random() < 0.5:
+            ancestor = ancestor.parent
+        # Nothing reads the board between the two moves, so the rotation is
+        # still pending above <block> when it is moved.
+        if ancestor is not None:
+            ancestor.rotate(random.choice([1, 3]))
+        if random.random() < 0.5:
+            block.rotate(random.choice([1, 3]))
+        elif random.random() < 0.8:
+            block.swap(random.randint(0, 1))
+        elif block.smash():
+            blocks = all_blocks(board)
+        assert_grid_matches_flatten(board)
+
+
+def test_swap_grandchild_after_rotating_root() -> None:
+    """Swapping a grandchild held since before the root was rotated swaps
+    the cells the board shows for it.
+    """
+    board = random_board(3, 0)
+    grandchild = board.children[0].children[1]
+    assert_grid_matches_flatten(board)
+    board.rotate(1)
+    grandchild.swap(0)
+    assert_grid_matches_flatten(board)
+
+
+def expected_locations(block: Block, position: tuple, size: int,
+                       locations: dict) -> None:
+    """Record in <locations> the position and size of every Block within
+    <block>, laid out eagerly from the given <position> and <size>.
+    """
+    locations[id(block)] = (position, size)
+    half = size // 2
+    offsets = [(half, 0), (0, 0), (0, half), (half, half)]
+    for child, (dx, dy) in zip(block.children, offsets):
+        expected_locations(child, (position[0] + dx, position[1] + dy),
+                           round(size / 2.0), locations)
+
+
+def test_locations_follow_moves() -> None:
+    """Positions and sizes read after a batch of moves are those the whole
+    board would be laid out with.
+    """
+    board = random_board(5, 12)
+    for _ in range(30):
+        for _ in range(5):
+            block = random.choice(all_blocks(board))
+            block.rotate(random.choice([1, 3]))
+            block.swap(random.randint(0, 1))
+            if random.random() < 0.2:
+                block.smash()
+        locations = {}
+        expected_locations(board, (0, 0), BOARD_WIDTH, locations)
+        for block in random.sample(all_blocks(board), 10):
+            assert (block.position, block.size) == locations[id(block)]
+    board.update_block_locations((10, 20), 300)
+    locations = {}
+    expected_locations(board, (10, 20), 300, locations)
+    assert {(rectangle[1], rectangle[2][0])
+            for rectangle in board.rectangles_to_draw()} <= \
+        set(locations.values())
+
+
+def selected_by_containment(block: Block, location: tuple,
+                            level: int) -> Block:
+    """Return the block get_selected_block should select, found by checking
+    each child with Block.__contains__.
+    """
+    if location not in block or level == block.level or \
+            not block.children:
+        return block
+    for child in block.children:
+        if location in child:
+            return selected_by_containment(child, location, level)
+    return block
+
+
+def test_get_selected_block() -> None:
+    """The arithmetic hit-test selects the same block as containment checks,
+    including on shared edges and boards of odd size.
+    """
+    for seed, width in enumerate([750, 99, 37, 16]):
+        board = random_board(4, seed)
+        board.update_block_locations((3, 5), width)
+        for _ in range(300):
+            location = (random.randint(0, width + 8),
+                        random.randint(0, width + 10))
+            level = random.randint(0, 4)
+            assert board.get_selected_block(location, level) is \
+                selected_by_containment(board, location, level)
+
+
+def test_leaf_at_follows_moves() -> None:
+    """The cell-to-leaf table names the leaf covering each cell through
+    every kind of move.
+    """
+    board = random_board(3, 77)
+    board.leaf_at(0, 0)
+    for _ in range(60):
+        block = random.choice(all_blocks(board))
+        random.choice([lambda: block.rotate(random.choice([1, 3])),
+                       lambda: block.swap(random.randint(0, 1)),
+                       block.smash])()
+        for leaf in all_blocks(board):
+            if not leaf.children:
+                column, row, span = leaf.cell_bounds()
+                assert board.leaf_at(column + span - 1, row) is leaf
+                assert board.leaf_levels[column, row + span - 1] == leaf.level
+
+
+def test_pop_damage() -> None:
+    """Moves and highlighting report the areas they change, and the first
+    draw after the board is laid out covers the whole board.
+    """
+    board = random_board(3, 5)
+    assert board.pop_damage() is None
+    assert board.pop_damage() == []
+    block = board.children[2]
+    block.rotate(1)
+    block.highlighted = True
+    block.highlighted = True
+    x, y = block.position
+    assert board.pop_damage() == [(x, y, block.size, block.size)]
+    assert all(rectangle[1][0] < x + block.size and rectangle[1][1] >= y
+               for rectangle in board.rectangles_to_draw(
+                   (x, y, block.size, block.size)))
+    board.update_block_locations((0, 0), 500)
+    assert board.pop_damage() is None
+
+
+def test_highlighted_blocks() -> None:
+    """highlighted_blocks lists the highlighted Blocks still in the tree.
+    """
+    board = random_board(3, 8)
+    while not board.children[0].children:
+        board.children[0].smash()
+    block = board.children[0].children[1]
+    block.highlighted = True
+    board.children[3].highlighted = True
+    board.children[3].highlighted = False
+    assert board.highlighted_blocks() == [block]
+    board.children[0].smash()
+    assert board.highlighted_blocks() == []
+
+
+def test_iter_rectangles_highlights_last() -> None:
+    """iter_rectangles yields the rectangles of rectangles_to_draw, with the
+    highlight frames last if asked.
+    """
+    board = random_board(4, 19)
+    board.children[0].highlighted = True
+    rectangles = list(board.iter_rectangles(highlights_last=True))
+    assert sorted(rectangles) == sorted(board.rectangles_to_draw())
+    assert rectangles[-1] == (TEMPTING_TURQUOISE, board.children[0].position,
+                              (board.children[0].size,) * 2, 5)
+    assert TEMPTING_TURQUOISE not in [rectangle[0]
+                                      for rectangle in rectangles[:-1]]
+
+
+def test_iter_rectangles_min_size() -> None:
+    """Blocks below the minimum size are drawn as one unframed cell in the
+    colour of their upper-left unit cell.
+    """
+    board = random_board(4, 23)
+    leaf = board
+    while leaf.children:
+        leaf = leaf.children[1]
+    assert list(board.iter_rectangles(min_size=BOARD_WIDTH + 1)) == \
+        [(leaf.colour, (0, 0), (BOARD_WIDTH, BOARD_WIDTH), 0)]
+    rectangles = list(board.iter_rectangles(min_size=BOARD_WIDTH // 4))
+    assert all(rectangle[2][0] >= BOARD_WIDTH // 4 or rectangle[3] == 0
+               for rectangle in rectangles)
+
+
+def test_iter_moves_are_distinct_and_change_the_board() -> None:
+    """iter_moves yields, for each Block, one move for each different board
+    that rotating or swapping it gives, and none that leave the board as it
+    is.
+    """
+    for seed in range(5):
+        board = random_board(4, seed)
+        moves = list(board.iter_moves())
+        for block in all_blocks(board):
+            before = board.grid.copy()
+            boards = []
+            for action, direction in REARRANGING_MOVES:
+                after = before.copy()
+                column, row, span = block.cell_bounds()
+                after[column:column + span, row:row + span] = \
+                    block.grid_after(action, direction)
+                if not (after == before).all() and \
+                        not any((after == other).all() for other in boards):
+                    boards.append(after)
+            yielded = [move for move in moves if move[0] is block]
+            assert len(yielded) == len(boards)
+
+
+def test_histogram_follows_moves() -> None:
+    """The histogram and uniform flag of every Block stay in sync with its
+    grid through every kind of move.
+    """
+    board = random_board(3, 57)
+    for _ in range(100):
+        block = random.choice(all_blocks(board))
+        action, direction = random.choice(REARRANGING_MOVES + [('smash', 0)])
+        apply_move(block, action, direction)
+        for other in all_blocks(board):
+            counts = np.bincount(other.grid.ravel(),
+                                 minlength=len(COLOUR_LIST))
+            assert other.histogram == tuple(counts)
+            assert other.uniform == (np.count_nonzero(counts) == 1)
+
+
+def test_colour_change_updates_board() -> None:
+    """Painting an undivided Block a new colour changes the grid, caches,
+    hash and revision of its tree as a move would.
+    """
+    board = random_board(3, 83)
+    for _ in range(50):
+        # Fill the caches before changing a colour.
+        board.flatten()
+        assert sum(board.histogram) == len(board.grid) ** 2
+        column, row = random.randrange(8), random.randrange(8)
+        leaf = board.leaf_at(column, row)
+        revision = board.revision
+        leaf.colour = random.choice([colour for colour in COLOUR_LIST
+                                     if colour != leaf.colour])
+        assert board.revision > revision
+        assert board.leaf_at(column, row) is leaf
+        assert_grid_matches_flatten(board)
+        counts = np.bincount(board.grid.ravel(), minlength=len(COLOUR_LIST))
+        assert board.histogram == tuple(counts)
+        assert board.zobrist == zobrist_hash(board.grid, 0, 0,
+                                             len(board.grid),
+                                             len(COLOUR_LIST))
+
+
+def test_iter_moves_for_colour() -> None:
+    """With a colour, iter_moves yields only moves that move the cells of
+    that colour.
+    """
+    board = random_board(4, 61)
+    for colour in range(len(COLOUR_LIST)):
+        for block, action, direction in board.iter_moves(colour=colour):
+            after = block.grid_after(action, direction) == colour
+            assert not (after == (block.grid == colour)).all()
+
+
+def test_undo_move_with_stale_blocks() -> None:
+    """Moves on Blocks found before other moves were made, as a search makes
+    them, are undone in reverse order back to the board they started from.
+    """
+    for seed in range(20):
+        board = random_board(3, seed)
+        before = board.grid.copy()
+        moves = list(board.iter_moves())
+        made = random.sample(moves, min(len(moves), 6))
+        for block, action, direction in made:
+            apply_move(block, action, direction)
+        after = board.grid.copy()
+        for block, action, direction in reversed(made):
+            undo_move(block, action, direction)
+        assert (board.grid == before).all()
+        for block, action, direction in made:
+            apply_move(block, action, direction)
+        assert (board.grid == after).all()
+        assert_grid_matches_flatten(board)
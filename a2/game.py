@@ -15,11 +15,13 @@ At the bottom of the file, there are some function that you
 can call to try playing the game in several different configurations.
 """
 import random
-from typing import List
+from typing import List, Optional
 from block import Block, random_init
 from goal import BlobGoal, PerimeterGoal
-from player import Player, HumanPlayer, RandomPlayer, SmartPlayer
-from renderer import Renderer, COLOUR_LIST, colour_name, BOARD_WIDTH
+from player import Player, HumanPlayer, RandomPlayer, SmartPlayer, \
+    SearchPlayer
+from renderer import Renderer, NullRenderer, COLOUR_LIST, colour_name, \
+    BOARD_WIDTH
 
 
 class Game:
@@ -44,18 +46,48 @@ class Game:
     def __init__(self, max_depth: int,
                  num_human: int,
                  random_players: int,
-                 smart_players: List[int]) -> None:
+                 smart_players: List[int],
+                 headless: bool = False,
+                 smart_workers: int = 0,
+                 blit: bool = False,
+                 max_fps: Optional[int] = None,
+                 search_players: Optional[List[int]] = None) -> None:
         """Initialize this game, as described in the Assignment 2 handout.
 
+        If <headless> is True, nothing is drawn and computer players do not
+        pause between moves, so the game runs as fast as moves can be made
+        and scored.
+
+        If <smart_workers> is positive, each SmartPlayer scores its moves in
+        parallel in that many worker processes.
+
+        If <blit> is True, the board is drawn by blitting its grid of colours,
+        which is faster on deep boards.
+
+        If <max_fps> is not None, human players' screens are redrawn at most
+        that many times a second.
+
+        If <search_players> is given, a SearchPlayer is added after the
+        other players for each entry, looking that many turns ahead.  Each
+        SearchPlayer is given the list of players, so that it can search
+        the turns of the other players too.
+
         Precondition:
             2 <= max_depth <= 5
+            num_human == 0 if headless
         """
 
         goals = (BlobGoal, PerimeterGoal)
 
-        total_num = num_human + random_players + len(smart_players)
+        if search_players is None:
+            search_players = []
+        total_num = num_human + random_players + len(smart_players) + \
+            len(search_players)
         # Initialize renderer
-        self.renderer = Renderer(total_num)
+        if headless:
+            self.renderer = NullRenderer(total_num)
+        else:
+            self.renderer = Renderer(total_num, blit, max_fps)
 
         # Generate and update board
         self.board = random_init(0, max_depth)
@@ -96,13 +128,22 @@ class Game:
             SmartPlayer(
                 self.renderer,
                 i + id_offset,
-                goal(random.choice(COLOUR_LIST)), difficulty)
+                goal(random.choice(COLOUR_LIST)), difficulty, smart_workers)
             # iterates <len(smart_players)> times,
             # capturing difficulty levels
             for i, difficulty in enumerate(smart_players)
         ]
         self.players.extend(smart_list)
 
+        # Generate and add some SearchPlayers, which search the turns of
+        # every player
+        id_offset += len(smart_players)
+        self.players.extend(
+            SearchPlayer(self.renderer, i + id_offset,
+                         goal(random.choice(COLOUR_LIST)), depth,
+                         players=self.players)
+            for i, depth in enumerate(search_players))
+
     def run_game(self, num_turns: int) -> None:
         """Run the game for the number of turns specified.
 
@@ -126,14 +167,14 @@ class Game:
                 break
             else:
                 print(f'Player {player.id} CURRENT SCORE: ' +
-                      f'{player.goal.score(self.board)}')
+                      f'{player.goal.cached_score(self.board)}')
                 index = (index + 1) % len(self.players)
 
         # Determine and report the winner.
         max_score = 0
         winning_player = 0
         for i in range(len(self.players)):
-            score = self.players[i].goal.score(self.board)
+            score = self.players[i].goal.cached_score(self.board)
             print(f'Player {i} : {score}')
             if score > max_score:
                 max_score = score
@@ -145,6 +186,10 @@ class Game:
                   f'goal = \n\t{player.goal.description()}: ' +
                   f'{colour_name(player.goal.colour)}')
 
+        for player in self.players:
+            if isinstance(player, SmartPlayer):
+                player.close()
+
 
 def auto_game() -> None:
     """Run a game with two computer players of different difficulty.
@@ -154,6 +199,15 @@ def auto_game() -> None:
     game.run_game(10)
 
 
+def search_game() -> None:
+    """Run a game between a smart player and a player that searches three
+    turns ahead, without opening a window.
+    """
+    random.seed(1001)
+    game = Game(4, 0, 0, [5], headless=True, search_players=[3])
+    game.run_game(10)
+
+
 def two_player_game() -> None:
     """Run a game with two human players.
     """
@@ -195,6 +249,13 @@ def random_game() -> None:
     game.run_game(50)
 
 
+def headless_game() -> None:
+    """Run a game with three random players without opening a window.
+    """
+    game = Game(4, 0, 3, [], headless=True)
+    game.run_game(50)
+
+
 if __name__ == '__main__':
     import python_ta
 
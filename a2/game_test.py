@@ -0,0 +1,19 @@
+import random
+import pygame
+from game import Game
+
+
+def test_headless_game_never_initializes_pygame(monkeypatch) -> None:
+    """A headless game runs to the end without a display, and never
+    initializes pygame.
+    """
+    def refuse() -> None:
+        raise AssertionError('a headless game initialized pygame')
+
+    monkeypatch.delenv('DISPLAY', raising=False)
+    monkeypatch.setattr(pygame, 'init', refuse)
+    monkeypatch.setattr(pygame.display, 'init', refuse)
+    random.seed(148)
+    game = Game(4, 0, 3, [], headless=True)
+    game.run_game(5)
+    assert not pygame.display.get_init()
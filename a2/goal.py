@@ -11,8 +11,39 @@ University of Toronto
 This file contains the Goal class hierarchy.
 """
 
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 from block import Block
+from bitboard import largest_blob, perimeter_count
+from renderer import COLOUR_LIST, colour_index
+from zobrist import ScoreCache, zobrist_hashes
+
+# The deepest boards that goals score on the grid rather than on the Block
+# tree.  Past this depth the grid has too many cells for a goal to visit them
+# all cheaply.
+GRID_SCORING_DEPTH = 6
+
+# The deepest boards that BlobGoal scores on bitboards rather than by
+# labelling the grid.  Flood filling one blob at a time falls behind
+# labelling them all at once when there are many blobs.
+BITBOARD_BLOB_DEPTH = 5
+
+# The most scores kept by SCORE_CACHE
+SCORE_CACHE_SIZE = 2 ** 16
+
+# Scores of boards seen before, shared by every goal, under the canonical
+# Zobrist hash of the board, the width of the board, and the class and colour
+# of the goal.  Every goal scores a board and its rotations and reflections
+# the same, so they share one score.
+SCORE_CACHE = ScoreCache(SCORE_CACHE_SIZE)
+
+# Bit flags for the edges of the board a Block lies along
+TOP, RIGHT, BOTTOM, LEFT = 1, 2, 4, 8
+ALL_EDGES = TOP | RIGHT | BOTTOM | LEFT
+# The edges of its parent that each child lies along, in child order
+CHILD_EDGES = [TOP | RIGHT, TOP | LEFT, BOTTOM | LEFT, BOTTOM | RIGHT]
+# The number of edges in each combination of edge flags
+EDGE_COUNTS = [bin(edges).count('1') for edges in range(ALL_EDGES + 1)]
 
 
 class Goal:
@@ -25,12 +56,19 @@ class Goal:
         The target colour for this goal, that is the colour to which
         this goal applies.
     """
+    # === Private Attributes ===
+    # _memo:
+    #     Work saved by score_move between calls, as a tuple of the board it
+    #     was done for, the board's revision at the time, a key describing
+    #     the work, and the work itself, or None if nothing has been saved.
     colour: Tuple[int, int, int]
+    _memo: Optional[Tuple[Block, int, Any, Any]]
 
     def __init__(self, target_colour: Tuple[int, int, int]) -> None:
         """Initialize this goal to have the given target colour.
         """
         self.colour = target_colour
+        self._memo = None
 
     def score(self, board: Block) -> int:
         """Return the current score for this goal on the given board.
@@ -39,6 +77,148 @@ class Goal:
         """
         raise NotImplementedError
 
+    def score_move(self, board: Block, block: Block, action: str,
+                   direction: int = 0,
+                   children: Optional[List[Block]] = None) -> int:
+        """Return the score for this goal on <board> as it would be after a
+        move on <block>, without making the move.
+
+        <block> is within <board>.  <action> is 'rotate', 'swap' or 'smash',
+        and <direction> is the direction of a rotation or swap.  For a smash,
+        <children> are the new children <block> would get, as returned by
+        Block.smashed_children.
+
+        Work that does not depend on the move is saved for the next call on
+        the same board, so scoring several moves on one board in a row is
+        much cheaper than making each move and calling score.  That work may
+        take time proportional to the size of the board, but each move then
+        examines only the cells of <block> and the cells around it.
+        """
+        raise NotImplementedError
+
+    def max_score(self, board: Block) -> int:
+        """Return an upper bound on the score for this goal on <board> after
+        any number of rotations and swaps.
+
+        Rotations and swaps do not change how many cells of each colour the
+        board has, so the bound is worked out from the board's histogram.
+        """
+        raise NotImplementedError
+
+    def score_grids(self, grids: np.ndarray) -> np.ndarray:
+        """Return the score for this goal on each board in <grids>, a stack
+        of the colour-index grids of N boards of the same depth, as an array
+        of N scores.
+
+        All the boards are scored together by whole-array operations, so the
+        cost per board is far less than calling score on each.
+        """
+        raise NotImplementedError
+
+    def score_boards(self, boards: List[Block]) -> np.ndarray:
+        """Return the score for this goal on each of <boards>, which all have
+        the same max depth, as an array.
+
+        See score_grids.
+        """
+        return self.score_grids(np.stack([board.grid for board in boards]))
+
+    def score_moves(self, board: Block,
+                    moves: List[Tuple[Block, str, int]]) -> np.ndarray:
+        """Return the score for this goal on <board> as it would be after
+        each of <moves>, without making them, as an array.
+
+        Each move is a (block, action, direction) tuple, as for score_move,
+        and may have the new children of a smash as a fourth item.  The
+        scores of boards already in SCORE_CACHE are looked up.  The other
+        boards are built as grids, all scored at once by score_grids, and
+        added to the cache.  Moves that give the same board, or rotations
+        or reflections of one board, are scored once.
+        """
+        scores = np.empty(len(moves), dtype=int)
+        width = len(board.grid)
+        # The cache key, upper left cell, and region after the move of each
+        # board to be scored, and the boards to be scored by cache key
+        missing = []
+        pending = {}
+        # The index of each move whose score is not cached, and its key
+        waiting = []
+        # The upper left cell of each Block moved, and the hashes of the
+        # board without the Block's cells, by the id of the Block
+        places = {}
+        for i, move in enumerate(moves):
+            block, action, direction = move[:3]
+            children = move[3] if len(move) > 3 else None
+            if id(block) not in places:
+                column, row, _ = block.cell_bounds()
+                places[id(block)] = column, row, \
+                    board.zobrist_hashes() ^ zobrist_hashes(
+                        block.grid, column, row, width, len(COLOUR_LIST))
+            column, row, without = places[id(block)]
+            after = block.grid_after(action, direction, children)
+            key = self._cache_key(int((without ^ zobrist_hashes(
+                after, column, row, width, len(COLOUR_LIST))).min()), width)
+            score = SCORE_CACHE.get(key)
+            if score is not None:
+                scores[i] = score
+                continue
+            if key not in pending:
+                pending[key] = len(missing)
+                missing.append((key, column, row, after))
+            waiting.append((i, key))
+
+        if missing:
+            grids = np.repeat(board.grid[np.newaxis], len(missing), axis=0)
+            for grid, (_, column, row, after) in zip(grids, missing):
+                grid[column:column + len(after), row:row + len(after)] = after
+            found = self.score_grids(grids)
+            for (key, _, _, _), score in zip(missing, found):
+                SCORE_CACHE.put(key, int(score))
+            for i, key in waiting:
+                scores[i] = found[pending[key]]
+        return scores
+
+    def cached_score(self, board: Block) -> int:
+        """Return the same score as score, looking it up in SCORE_CACHE if
+        <board> has been scored for this goal before.
+        """
+        key = self._cache_key(board.canonical_zobrist, len(board.grid))
+        score = SCORE_CACHE.get(key)
+        if score is None:
+            score = self.score(board)
+            SCORE_CACHE.put(key, score)
+        return score
+
+    def _cache_key(self, zobrist: int, width: int) -> Tuple[Any, ...]:
+        """Return the key in SCORE_CACHE of the score for this goal on a
+        board <width> cells wide with canonical Zobrist hash <zobrist>.
+        """
+        return zobrist, width, type(self), self.colour
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state to pickle this goal with, leaving out saved work
+        so that the board it was saved for is not pickled too.
+        """
+        state = self.__dict__.copy()
+        state['_memo'] = None
+        return state
+
+    def _recall(self, board: Block, key: Any) -> Any:
+        """Return the work saved under <key> for <board> as it is now, or None
+        if there is none.
+        """
+        if self._memo is not None and self._memo[0] is board and \
+                self._memo[1] == board.revision and self._memo[2] is key:
+            return self._memo[3]
+        return None
+
+    def _remember(self, board: Block, key: Any, work: Any) -> Any:
+        """Save <work> under <key> for <board> as it is now, replacing any
+        work saved before, and return <work>.
+        """
+        self._memo = (board, board.revision, key, work)
+        return work
+
     def description(self) -> str:
         """Return a description of this goal.
         """
@@ -51,7 +231,7 @@ class BlobGoal(Goal):
     """
 
     def _undiscovered_blob_size(self, pos: Tuple[int, int],
-                                board: List[List[Tuple[int, int, int]]],
+                                board: List[List[int]],
                                 visited: List[List[int]]) -> int:
         """Return the size of the largest connected blob that (a) is of this
         Goal's target colour, (b) includes the cell at <pos>, and (c) involves
@@ -59,7 +239,8 @@ class BlobGoal(Goal):
 
         If <pos> is out of bounds for <board>, return 0.
 
-        <board> is the flattened board on which to search for the blob.
+        <board> is the colour-index grid of the board on which to search for
+        the blob, as a list of columns.
         <visited> is a parallel structure that, in each cell, contains:
            -1  if this cell has never been visited
             0  if this cell has been visited and discovered
@@ -74,8 +255,10 @@ class BlobGoal(Goal):
         recursive backtracking maze generation algorithm
         """
 
+        target = colour_index(self.colour)
+
         # if initial block is not of self.colour, return 0
-        if board[pos[0]][pos[1]] != self.colour:
+        if board[pos[0]][pos[1]] != target:
             return 0
 
         current = pos
@@ -106,25 +289,25 @@ class BlobGoal(Goal):
             # go up
             if y >= 1 \
                     and visited[x][y - 1] == -1 \
-                    and board[x][y - 1] == self.colour:
+                    and board[x][y - 1] == target:
                 current = (x, y - 1)
 
             # go down
             elif y <= len(board) - 2 \
                     and visited[x][y + 1] == -1 \
-                    and board[x][y + 1] == self.colour:
+                    and board[x][y + 1] == target:
                 current = (x, y + 1)
 
             # go left
             elif x >= 1 \
                     and visited[x - 1][y] == -1 \
-                    and board[x - 1][y] == self.colour:
+                    and board[x - 1][y] == target:
                 current = (x - 1, y)
 
             # go right
             elif x <= len(board) - 2 \
                     and visited[x + 1][y] == -1 \
-                    and board[x + 1][y] == self.colour:
+                    and board[x + 1][y] == target:
                 current = (x + 1, y)
 
             # if all neighbours are visited
@@ -140,29 +323,124 @@ class BlobGoal(Goal):
         return count
 
     def score(self, board: Block) -> int:
+        """Return the size of the largest blob of this goal's target colour
+        on <board>.
+
+        Boards up to BITBOARD_BLOB_DEPTH deep are scored by flood filling
+        their bitboards.  Boards up to GRID_SCORING_DEPTH deep are scored on
+        their grid, where the blobs are labelled all at once by
+        largest_blob_size (_undiscovered_blob_size finds the same blobs one
+        cell at a time).  Deeper boards are scored on the Block tree by
+        score_tree.  The depth of a board that is a Block within a bigger
+        tree is counted from its own level.
+        """
+        depth = board.max_depth - board.level
+        if depth > GRID_SCORING_DEPTH:
+            return self.score_tree(board)
+        if depth <= BITBOARD_BLOB_DEPTH:
+            return largest_blob(board.bitboards[colour_index(self.colour)],
+                                2 ** depth)
+        return largest_blob_size(board.grid == colour_index(self.colour))
+
+    def score_move(self, board: Block, block: Block, action: str,
+                   direction: int = 0,
+                   children: Optional[List[Block]] = None) -> int:
+        """Return the score for this goal on <board> as it would be after a
+        move on <block>, without making the move.
+
+        See Goal.score_move.  The blobs outside <block> are not changed by
+        the move, so they are labelled once per block and saved.  Labelling
+        them reads every cell of the board, so scoring moves on many
+        different blocks costs that much for each block.  Only the blobs
+        inside the moved block are labelled for each move, and joined to the
+        outside blobs they touch.
+        """
+        target = colour_index(self.colour)
+        column, row, span = block.cell_bounds()
+        outside = self._recall(board, block)
+        if outside is None:
+            mask = board.grid == target
+            mask[column:column + span, row:row + span] = False
+            outside = self._remember(board, block, label_blobs(mask))
+        labels, sizes = outside
+
+        inside, inside_sizes = label_blobs(
+            block.grid_after(action, direction, children) == target)
+
+        # Union-find over inside blobs (keys > 0) and outside blobs (keys < 0)
+        parents = {}
+        weights = {}
+        for inner, outer in _blobs_across(inside, labels, column, row, span):
+            roots = []
+            for key, size in ((inner, inside_sizes[inner]),
+                              (-outer, sizes[outer])):
+                if key not in parents:
+                    parents[key] = key
+                    weights[key] = int(size)
+                while parents[key] != key:
+                    parents[key] = parents[parents[key]]
+                    key = parents[key]
+                roots.append(key)
+            if roots[0] != roots[1]:
+                parents[roots[1]] = roots[0]
+                weights[roots[0]] += weights[roots[1]]
+
+        return max(int(sizes.max()), int(inside_sizes.max()),
+                   max(weights.values(), default=0))
+
+    def max_score(self, board: Block) -> int:
+        """Return the number of cells of this goal's target colour on
+        <board>, which no blob can be larger than.
+
+        See Goal.max_score.
+        """
+        return board.histogram[colour_index(self.colour)]
+
+    def score_grids(self, grids: np.ndarray) -> np.ndarray:
+        """Return the size of the largest blob of this goal's target colour
+        on each board in the stack <grids>.
+
+        See Goal.score_grids.  The blobs of all the boards are labelled
+        together, as if the boards were one grid, by largest_blob_sizes.
+        """
+        return largest_blob_sizes(grids == colour_index(self.colour))
 
-        current_score = 0
-
-        flattened = board.flatten()
-
-        visited = [[-1 for _ in range(len(flattened))] for _ in
-                   range(len(flattened))]
-
-        for x, item in enumerate(flattened):
-            for y in range(len(item)):
-                # if current position is unchecked, check it.
-                # Since the recursive back-tracker algorithm
-                # is exhaustive for all cells
-                # two checks within the same blocks
-                # is guaranteed to have the same
-                # score
-                if visited[x][y] == -1:
-                    current_score = max(
-                        self._undiscovered_blob_size((x, y),
-                                                     flattened,
-                                                     visited),
-                        current_score)
-        return current_score
+    def score_tree(self, board: Block) -> int:
+        """Return the same score as score, computed directly from the Block
+        tree without building or reading the grid.
+
+        Each undivided Block of the target colour is a single region whose
+        size is its number of unit cells.  Regions that share an edge are
+        merged with a union-find, so the cost depends on the number of
+        undivided Blocks rather than the number of unit cells.
+        """
+        target = colour_index(self.colour)
+        max_depth = board.max_depth
+        leaf_sizes = []
+        # The union-find parent of each region, indexed like leaf_sizes
+        parents = []
+        # The index of each target-coloured leaf, by id
+        indices = {}
+
+        stack = [board]
+        while stack:
+            block = stack.pop()
+            if block.children:
+                stack.extend(block.children)
+            elif block.colour_index == target:
+                indices[id(block)] = len(leaf_sizes)
+                parents.append(len(leaf_sizes))
+                leaf_sizes.append(4 ** (max_depth - block.level))
+
+        for first, second in adjacent_leaves(board, target):
+            root1 = _find(parents, indices[id(first)])
+            root2 = _find(parents, indices[id(second)])
+            if root1 != root2:
+                parents[root2] = root1
+                leaf_sizes[root1] += leaf_sizes[root2]
+
+        return max((leaf_sizes[i] for i in range(len(parents))
+                    if parents[i] == i), default=0)
 
     def description(self) -> str:
         """Return a description of this goal.
@@ -175,23 +453,114 @@ class PerimeterGoal(Goal):
     on the perimeter"""
 
     def score(self, board: Block) -> int:
-        score = 0
-        flat_block = board.flatten()
-        block_diameter = len(flat_block)
-
-        for i in range(block_diameter):
-            if flat_block[0][i] == self.colour:
-                score += 1
-
-            if flat_block[i][0] == self.colour:
-                score += 1
-
-            if flat_block[block_diameter - 1][i] == self.colour:
-                score += 1
-
-            if flat_block[i][block_diameter - 1] == self.colour:
-                score += 1
+        """Return the number of unit cells of this goal's target colour along
+        the edges of <board>, counting corner cells twice.
 
+        Boards up to GRID_SCORING_DEPTH deep are scored by counting the
+        cells of their bitboard under a mask of each edge.  Deeper boards are
+        scored by score_tree.  As for BlobGoal.score, the depth of a board
+        that is a Block within a bigger tree is counted from its own level.
+        """
+        depth = board.max_depth - board.level
+        if depth > GRID_SCORING_DEPTH:
+            return self.score_tree(board)
+        return perimeter_count(board.bitboards[colour_index(self.colour)],
+                               2 ** depth)
+
+    def score_move(self, board: Block, block: Block, action: str,
+                   direction: int = 0,
+                   children: Optional[List[Block]] = None) -> int:
+        """Return the score for this goal on <board> as it would be after a
+        move on <block>, without making the move.
+
+        See Goal.score_move.  A move only changes the score if <block> lies
+        along an edge of the board, and then only by the change in the
+        number of target cells along those edges within <block>.
+        """
+        current = self._recall(board, None)
+        if current is None:
+            current = self._remember(board, None, self.score(board))
+
+        column, row, span = block.cell_bounds()
+        width = len(board.grid)
+        if 0 < column and column + span < width and \
+                0 < row and row + span < width:
+            return current
+
+        target = colour_index(self.colour)
+        before = self._edge_cells(block.grid, column, row, width, target)
+        after = self._edge_cells(block.grid_after(action, direction, children),
+                                 column, row, width, target)
+        return current + after - before
+
+    def max_score(self, board: Block) -> int:
+        """Return the score for this goal on <board> if as many cells of
+        its target colour as possible were on the edges, corners first.
+
+        See Goal.max_score.
+        """
+        count = board.histogram[colour_index(self.colour)]
+        width = 2 ** (board.max_depth - board.level)
+        if width == 1:
+            # The only cell lies along all four edges.
+            return 4 * count
+        return min(count + min(count, 4), 4 * width)
+
+    def score_grids(self, grids: np.ndarray) -> np.ndarray:
+        """Return the number of unit cells of this goal's target colour along
+        the edges of each board in the stack <grids>, counting corner cells
+        twice.
+
+        See Goal.score_grids.
+        """
+        target = grids == colour_index(self.colour)
+        return (np.count_nonzero(target[:, 0], axis=1) +
+                np.count_nonzero(target[:, -1], axis=1) +
+                np.count_nonzero(target[:, :, 0], axis=1) +
+                np.count_nonzero(target[:, :, -1], axis=1))
+
+    @staticmethod
+    def _edge_cells(region: np.ndarray, column: int, row: int, width: int,
+                    target: int) -> int:
+        """Return the number of cells of colour index <target> along the
+        edges of a board <width> cells wide within <region>, counting corner
+        cells twice.
+
+        <region> is the grid of a block whose upper left unit cell is at
+        (<column>, <row>).
+        """
+        count = 0
+        if column == 0:
+            count += np.count_nonzero(region[0] == target)
+        if column + len(region) == width:
+            count += np.count_nonzero(region[-1] == target)
+        if row == 0:
+            count += np.count_nonzero(region[:, 0] == target)
+        if row + len(region) == width:
+            count += np.count_nonzero(region[:, -1] == target)
+        return int(count)
+
+    def score_tree(self, board: Block) -> int:
+        """Return the same score as score, computed directly from the Block
+        tree without building or reading the grid.
+
+        Only Blocks along the edges of the board are visited.  Each undivided
+        one of the target colour scores its width in unit cells once for
+        every edge of the board it lies along.
+        """
+        target = colour_index(self.colour)
+        max_depth = board.max_depth
+        score = 0
+        stack = [(board, ALL_EDGES)]
+        while stack:
+            block, edges = stack.pop()
+            if block.children:
+                for child, child_edges in zip(block.children, CHILD_EDGES):
+                    if edges & child_edges:
+                        stack.append((child, edges & child_edges))
+            elif block.colour_index == target:
+                score += 2 ** (max_depth - block.level) * \
+                    EDGE_COUNTS[edges]
         return score
 
     def description(self) -> str:
@@ -200,13 +569,198 @@ class PerimeterGoal(Goal):
         return "Get the most of your color on the edge of the board!"
 
 
+def largest_blob_size(mask: np.ndarray) -> int:
+    """Return the number of cells in the largest connected blob of True cells
+    in the two-dimensional boolean array <mask>.
+    """
+    _, run_labels, run_sizes = _label_runs(mask)
+    return int(np.bincount(run_labels[1:], weights=run_sizes[1:],
+                           minlength=1).max())
+
+
+def largest_blob_sizes(masks: np.ndarray) -> np.ndarray:
+    """Return the number of cells in the largest connected blob of True
+    cells in each two-dimensional boolean array in the stack <masks>.
+
+    Cells of different arrays in the stack are never connected.
+    """
+    run_ids, run_labels, run_sizes = _label_runs(masks)
+    blob_sizes = np.bincount(run_labels, weights=run_sizes,
+                             minlength=len(run_labels)).astype(int)
+    # The index in the stack of each run, and so of each blob, whose label
+    # is the id of one of its runs
+    run_masks = np.zeros(len(run_labels), dtype=int)
+    run_masks[run_ids.reshape(len(masks), -1)] = \
+        np.arange(len(masks))[:, np.newaxis]
+    largest = np.zeros(len(masks), dtype=int)
+    np.maximum.at(largest, run_masks[1:], blob_sizes[1:])
+    return largest
+
+
+def label_blobs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return a labelling of the connected blobs of True cells in the
+    two-dimensional boolean array <mask>.
+
+    Return (labels, sizes), where <labels> has the shape of <mask> and gives
+    each True cell the positive label of its blob and each False cell 0, and
+    sizes[label] is the number of cells in the blob with that label.
+    sizes[0] is 0.
+    """
+    run_ids, run_labels, run_sizes = _label_runs(mask)
+    sizes = np.bincount(run_labels, weights=run_sizes).astype(int)
+    sizes[0] = 0
+    return run_labels[run_ids], sizes
+
+
+def _label_runs(mask: np.ndarray) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (run_ids, run_labels, run_sizes) for the connected blobs of True
+    cells in the two-dimensional boolean array <mask>, or in each array of a
+    stack of them.
+
+    Cells are connected if they share an edge.  The cells of each column are
+    first grouped into runs, that is, maximal stretches of True cells, which
+    are numbered 1, 2, ... in <run_ids> (False cells get 0).  Runs in
+    neighbouring columns that share a row are connected, and runs are merged
+    into blobs by repeatedly giving both ends of every connection the
+    smaller of their two labels and then following labels to their own label
+    (pointer jumping), until no label changes.  run_labels[run] is the label
+    of the blob the run is in, and run_sizes[run] is its number of cells.
+    """
+    # Number the runs 1, 2, ... in column order; cells outside any run get 0.
+    starts = mask.copy()
+    starts[..., 1:] &= ~mask[..., :-1]
+    run_ids = np.cumsum(starts).reshape(mask.shape)
+    run_ids[~mask] = 0
+    num_runs = int(run_ids.max())
+    run_sizes = np.bincount(run_ids.ravel(), minlength=num_runs + 1)
+
+    # Pairs of runs in neighbouring columns that share at least one row.  The
+    # rows two runs share are consecutive, so each pair is taken from the
+    # first of them only.
+    touching = mask[..., :-1, :] & mask[..., 1:, :]
+    first = touching.copy()
+    first[..., 1:] &= ~touching[..., :-1]
+    left = run_ids[..., :-1, :][first]
+    right = run_ids[..., 1:, :][first]
+
+    labels = np.arange(num_runs + 1)
+    while True:
+        lowest = np.minimum(labels[left], labels[right])
+        merged = labels.copy()
+        for ends in (left, right, labels[left], labels[right]):
+            np.minimum.at(merged, ends, lowest)
+        merged = merged[merged]
+        if np.array_equal(merged, labels):
+            break
+        labels = merged
+    return run_ids, labels, run_sizes
+
+
+def _blobs_across(inside: np.ndarray, outside: np.ndarray, column: int,
+                  row: int, span: int) -> List[Tuple[int, int]]:
+    """Return the distinct pairs of labels of blobs that meet across the
+    border of a block.
+
+    <inside> labels the cells of the block, whose upper left unit cell is at
+    (<column>, <row>) and whose width is <span>.  <outside> labels the
+    cells of the whole board.  Only pairs where both labels are positive
+    are returned.
+    """
+    width = len(outside)
+    last = span - 1
+    # The cells just inside and just outside each side of the block
+    sides = []
+    if column > 0:
+        sides.append((inside[0], outside[column - 1, row:row + span]))
+    if column + span < width:
+        sides.append((inside[last], outside[column + span, row:row + span]))
+    if row > 0:
+        sides.append((inside[:, 0], outside[column:column + span, row - 1]))
+    if row + span < width:
+        sides.append((inside[:, last],
+                      outside[column:column + span, row + span]))
+
+    pairs = set()
+    for inner, outer in sides:
+        meeting = (inner > 0) & (outer > 0)
+        pairs.update(zip(inner[meeting].tolist(), outer[meeting].tolist()))
+    return list(pairs)
+
+
+def _find(parents: List[int], i: int) -> int:
+    """Return the root of <i> in the union-find <parents>, halving the path
+    to it on the way.
+    """
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def adjacent_leaves(block: Block, colour: int) -> List[Tuple[Block, Block]]:
+    """Return every pair of undivided Blocks within <block> whose colour has
+    index <colour> in COLOUR_LIST, and that share at least part of an edge.
+    """
+    pairs = []
+    stack = [block]
+    while stack:
+        block = stack.pop()
+        if block.children:
+            upper_right, upper_left, lower_left, lower_right = block.children
+            _add_edge_leaves(upper_left, upper_right, True, colour, pairs)
+            _add_edge_leaves(lower_left, lower_right, True, colour, pairs)
+            _add_edge_leaves(upper_left, lower_left, False, colour, pairs)
+            _add_edge_leaves(upper_right, lower_right, False, colour, pairs)
+            stack.extend(block.children)
+    return pairs
+
+
+def _add_edge_leaves(first: Block, second: Block, beside: bool,
+                     colour: int, pairs: List[Tuple[Block, Block]]) -> None:
+    """Append to <pairs> every pair of undivided Blocks of colour index
+    <colour>, one within <first> and one within <second>, that meet along the
+    edge between them.
+
+    <second> is immediately to the right of <first> if <beside> is True, and
+    immediately below it otherwise.  The two Blocks need not be the same size.
+    """
+    if beside:
+        # Children along the right edge of first and the left edge of second
+        first_side, second_side = (0, 3), (1, 2)
+    else:
+        # Children along the bottom edge of first and the top edge of second
+        first_side, second_side = (2, 3), (1, 0)
+
+    if not first.children:
+        if first.colour_index != colour:
+            return
+        if not second.children:
+            if second.colour_index == colour:
+                pairs.append((first, second))
+        else:
+            for i in second_side:
+                _add_edge_leaves(first, second.children[i], beside, colour,
+                                 pairs)
+    elif not second.children:
+        if second.colour_index == colour:
+            for i in first_side:
+                _add_edge_leaves(first.children[i], second, beside, colour,
+                                 pairs)
+    else:
+        for i, j in zip(first_side, second_side):
+            _add_edge_leaves(first.children[i], second.children[j], beside,
+                             colour, pairs)
+
+
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing',
-            'block', 'goal', 'player', 'renderer'
+            'block', 'goal', 'player', 'renderer', 'bitboard', 'numpy',
+            'zobrist'
         ],
         'max-attributes': 15
     })
@@ -0,0 +1,159 @@
+import random
+from block import Block
+from goal import BlobGoal, PerimeterGoal
+from renderer import COLOUR_LIST
+from testutil import all_blocks, random_board
+
+
+def blob_score_by_search(goal: BlobGoal, board: Block) -> int:
+    """Return the score of <goal> on <board>, found one blob at a time with
+    BlobGoal._undiscovered_blob_size on the flattened board.
+    """
+    cells = [[COLOUR_LIST.index(colour) for colour in column]
+             for column in board.flatten()]
+    visited = [[-1] * len(cells) for _ in cells]
+    best = 0
+    for x in range(len(cells)):
+        for y in range(len(cells)):
+            if visited[x][y] == -1:
+                best = max(best, goal._undiscovered_blob_size((x, y), cells,
+                                                              visited))
+    return best
+
+
+def perimeter_score_by_flatten(goal: PerimeterGoal, board: Block) -> int:
+    """Return the score of <goal> on <board>, counted on the flattened board.
+    """
+    flat = board.flatten()
+    last = len(flat) - 1
+    return sum((flat[0][i] == goal.colour) + (flat[i][0] == goal.colour) +
+               (flat[last][i] == goal.colour) + (flat[i][last] == goal.colour)
+               for i in range(len(flat)))
+
+
+def test_blob_score() -> None:
+    """BlobGoal.score finds the same largest blob as a cell-by-cell search.
+    """
+    for seed in range(40):
+        board = random_board(seed % 6 + 1, seed)
+        for colour in COLOUR_LIST:
+            goal = BlobGoal(colour)
+            assert goal.score(board) == blob_score_by_search(goal, board)
+
+
+def test_blob_score_single_block() -> None:
+    """A board that is one undivided block is one blob.
+    """
+    board = Block(0, COLOUR_LIST[0]).set_max_depth(3)
+    assert BlobGoal(COLOUR_LIST[0]).score(board) == 64
+    assert BlobGoal(COLOUR_LIST[1]).score(board) == 0
+
+
+def test_perimeter_score() -> None:
+    """PerimeterGoal.score counts the edge cells, with corners twice.
+    """
+    for seed in range(40):
+        board = random_board(seed % 6 + 1, seed)
+        for colour in COLOUR_LIST:
+            goal = PerimeterGoal(colour)
+            assert goal.score(board) == perimeter_score_by_flatten(goal, board)
+
+
+def test_blob_score_tree() -> None:
+    """BlobGoal.score_tree finds the same largest blob as a cell-by-cell
+    search.
+    """
+    for seed in range(40):
+        board = random_board(seed % 8, seed)
+        for colour in COLOUR_LIST:
+            goal = BlobGoal(colour)
+            assert goal.score_tree(board) == blob_score_by_search(goal, board)
+
+
+def test_perimeter_score_tree() -> None:
+    """PerimeterGoal.score_tree agrees with counting on the flattened board.
+    """
+    for seed in range(40):
+        board = random_board(seed % 8, seed)
+        for colour in COLOUR_LIST:
+            goal = PerimeterGoal(colour)
+            assert goal.score_tree(board) == \
+                perimeter_score_by_flatten(goal, board)
+
+
+def test_score_sub_block() -> None:
+    """A Block within a bigger tree is scored as a board of its own, as it
+    is flattened.
+    """
+    for seed in range(20):
+        board = random_board(4, seed)
+        for block in board.children + board.children[0].children:
+            for colour in COLOUR_LIST:
+                blob, perimeter = BlobGoal(colour), PerimeterGoal(colour)
+                assert blob.score(block) == blob_score_by_search(blob, block)
+                assert perimeter.score(block) == \
+                    perimeter_score_by_flatten(perimeter, block)
+                assert blob.max_score(block) >= blob.score(block)
+                assert perimeter.max_score(block) >= perimeter.score(block)
+
+
+def test_score_move() -> None:
+    """score_move predicts the score after a move without making it.
+    """
+    board = random_board(5, 31)
+    goals = [goal(colour) for goal in (BlobGoal, PerimeterGoal)
+             for colour in COLOUR_LIST]
+    for _ in range(150):
+        block = random.choice(all_blocks(board))
+        action = random.choice(['rotate', 'swap', 'smash'])
+        direction = random.choice([1, 3]) if action == 'rotate' else \
+            random.randint(0, 1)
+        children = None
+        if action == 'smash':
+            if block.level in (0, block.max_depth):
+                continue
+            children = block.smashed_children()
+
+        grid = board.grid.copy()
+        predicted = [goal.score_move(board, block, action, direction,
+                                     children) for goal in goals]
+        assert (board.grid == grid).all()
+
+        if action == 'rotate':
+            block.rotate(direction)
+        elif action == 'swap':
+            block.swap(direction)
+        else:
+            block.smash(children)
+        assert predicted == [goal.score(board) for goal in goals]
+
+
+def test_score_boards_and_moves() -> None:
+    """Scoring a batch of boards or moves at once gives the score of each.
+    """
+    boards = [random_board(4, seed) for seed in range(12)]
+    board = boards[0]
+    moves = [(block, action, direction)
+             for block in all_blocks(board)[:15]
+             for action, direction in [('rotate', 1), ('rotate', 3),
+                                       ('swap', 0), ('swap', 1)]]
+    for colour in COLOUR_LIST:
+        for goal in (BlobGoal(colour), PerimeterGoal(colour)):
+            assert goal.score_boards(boards).tolist() == \
+                [goal.score(board) for board in boards]
+            assert goal.score_moves(board, moves).tolist() == \
+                [goal.score_move(board, *move) for move in moves]
+
+
+def test_max_score_bounds_score() -> None:
+    """No rotation or swap takes a score past max_score.
+    """
+    for seed in range(5):
+        board = random_board(3, seed)
+        for colour in COLOUR_LIST:
+            for goal in (BlobGoal(colour), PerimeterGoal(colour)):
+                bound = goal.max_score(board)
+                moves = list(board.iter_moves())
+                assert all(score <= bound
+                           for score in goal.score_moves(board, moves))
+                assert goal.score(board) <= bound
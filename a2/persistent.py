@@ -0,0 +1,288 @@
+"""Assignment 2 - Blocky
+
+=== CSC148 Fall 2017 ===
+Diane Horton and David Liu
+Department of Computer Science,
+University of Toronto
+
+
+=== Module Description ===
+
+This file contains the PersistentBlock class, an immutable version of Block
+for exploring many possible boards at once.
+"""
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from bitboard import bitboards
+from block import Block, QUADRANT_OFFSETS, random_init, rotate_list
+from renderer import COLOUR_LIST, colour_index
+
+
+class PersistentBlock:
+    """An immutable square block in the Blocky game.
+
+    Moves on a PersistentBlock do not change it.  Instead they return a new
+    root that shares every subtree the move did not touch with the old one,
+    so making a move costs a number of new blocks proportional to the depth
+    of the moved block, and any number of boards can be kept at once.
+
+    PersistentBlocks have no parent, position or size, and cannot be
+    highlighted.  A block within a tree is identified by its path, the list
+    of child indices to follow from the root to reach it, as in Block.path.
+
+    === Public Attributes ===
+    level:
+        The level of this block within the overall block structure.
+    max_depth:
+        The deepest level allowed in the overall block structure.
+    colour:
+        The colour of this block if it is not subdivided, or None.
+    colour_index:
+        The index of <colour> in COLOUR_LIST, or None if <colour> is None.
+    children:
+        The blocks into which this block is subdivided, in the same order as
+        the children of a Block.
+
+    === Representation Invariants ===
+    - len(children) == 0 or len(children) == 4
+    - 0 <= _turns < 4
+    """
+    # === Private Attributes ===
+    # _children:
+    #     The children of this block before the pending turns are applied.
+    # _turns:
+    #     The number of clockwise quarter turns that have been applied to
+    #     this block but not yet to its children.  Rotating a block only
+    #     changes this count, and the children are turned when they are read.
+    # _resolved:
+    #     The children with the pending turns applied, or None if they have
+    #     not been read yet.
+    # _grid:
+    #     The colour-index grid of this block, or None if it has not been
+    #     read yet.
+    # _bitboards:
+    #     The bitboards of this block, or None if they have not been read
+    #     yet.
+    level: int
+    max_depth: int
+    colour_index: Optional[int]
+    _children: Tuple['PersistentBlock', ...]
+    _turns: int
+    _resolved: Optional[List['PersistentBlock']]
+    _grid: Optional[np.ndarray]
+    _bitboards: Optional[List[int]]
+
+    def __init__(self, level: int, max_depth: int,
+                 colour: Optional[Tuple[int, int, int]] = None,
+                 children: Tuple['PersistentBlock', ...] = (),
+                 turns: int = 0) -> None:
+        """Initialize this block with the given <level>, <max_depth>, and
+        either a <colour> or four <children>, turned clockwise <turns> times.
+        """
+        self.level = level
+        self.max_depth = max_depth
+        self.colour_index = None if colour is None else colour_index(colour)
+        self._children = tuple(children)
+        self._turns = turns % 4 if self._children else 0
+        self._resolved = None
+        self._grid = None
+        self._bitboards = None
+
+    @classmethod
+    def from_block(cls, block: Block,
+                   max_depth: Optional[int] = None) -> 'PersistentBlock':
+        """Return a PersistentBlock with the same colours and structure as
+        <block>.
+
+        <max_depth> is the max depth of <block>, if it is already known.
+        """
+        if max_depth is None:
+            max_depth = block.max_depth
+        return cls(block.level, max_depth, block.colour,
+                   tuple(cls.from_block(child, max_depth)
+                         for child in block.children))
+
+    @property
+    def colour(self) -> Optional[Tuple[int, int, int]]:
+        """The colour of this block.  See the class docstring.
+        """
+        if self.colour_index is None:
+            return None
+        return COLOUR_LIST[self.colour_index]
+
+    def to_block(self) -> Block:
+        """Return a new Block with the same colours and structure as this
+        block.
+
+        The caller is responsible for setting the new Block's position and
+        size with update_block_locations.
+        """
+        if not self._children:
+            return Block(self.level, self.colour).set_max_depth(self.max_depth)
+        return Block(self.level, children=[
+            child.to_block() for child in self.children
+        ]).set_max_depth(self.max_depth)
+
+    @property
+    def children(self) -> List['PersistentBlock']:
+        """The children of this block, in the same order as the children of
+        a Block.
+        """
+        if not self._children:
+            return []
+        if self._resolved is None:
+            self._resolved = [
+                child.turned(self._turns)
+                for child in rotate_list(list(self._children), -self._turns)
+            ]
+        return self._resolved
+
+    def turned(self, turns: int) -> 'PersistentBlock':
+        """Return this block turned clockwise <turns> times.
+
+        The new block shares this block's children, so this takes constant
+        time.
+        """
+        if turns % 4 == 0 or not self._children:
+            return self
+        return PersistentBlock(self.level, self.max_depth, None,
+                               self._children, self._turns + turns)
+
+    def descendant(self, path: List[int]) -> 'PersistentBlock':
+        """Return the block reached by following the child indices in <path>
+        from this block.
+        """
+        block = self
+        for i in path:
+            block = block.children[i]
+        return block
+
+    def rotate(self, path: List[int], direction: int) -> 'PersistentBlock':
+        """Return this tree after rotating the block at <path>, as
+        Block.rotate does.
+        """
+        return self._replace(path, lambda block: block.turned(
+            1 if direction == 1 else 3))
+
+    def swap(self, path: List[int], direction: int) -> 'PersistentBlock':
+        """Return this tree after swapping the children of the block at
+        <path>, as Block.swap does.
+        """
+        def swapped(block: 'PersistentBlock') -> 'PersistentBlock':
+            if not block._children:
+                return block
+            child0, child1, child2, child3 = block.children
+            if direction == 1:
+                children = (child3, child2, child1, child0)
+            else:
+                children = (child1, child0, child3, child2)
+            return PersistentBlock(block.level, block.max_depth, None,
+                                   children)
+        return self._replace(path, swapped)
+
+    def smash(self, path: List[int],
+              children: Optional[List['PersistentBlock']] = None) \
+            -> 'PersistentBlock':
+        """Return this tree after smashing the block at <path>, as Block.smash
+        does, or this tree itself if that block cannot be smashed.
+
+        If <children> is not None, they are the new children of the smashed
+        block; otherwise they are randomly generated.
+        """
+        def smashed(block: 'PersistentBlock') -> 'PersistentBlock':
+            new_children = children
+            if new_children is None:
+                new_children = [
+                    PersistentBlock.from_block(
+                        random_init(block.level + 1, block.max_depth))
+                    for _ in range(4)
+                ]
+            return PersistentBlock(block.level, block.max_depth, None,
+                                   tuple(new_children))
+
+        target = self.descendant(path)
+        if target.level == 0 or target.level == target.max_depth:
+            return self
+        return self._replace(path, smashed)
+
+    def apply(self, path: List[int], action: str, direction: int = 0) \
+            -> 'PersistentBlock':
+        """Return this tree after the move <action> on the block at <path>.
+
+        <action> is 'rotate', 'swap' or 'smash', and <direction> is the
+        direction of a rotation or swap.
+        """
+        if action == 'rotate':
+            return self.rotate(path, direction)
+        elif action == 'swap':
+            return self.swap(path, direction)
+        return self.smash(path)
+
+    def _replace(self, path: List[int],
+                 change: Callable[['PersistentBlock'], 'PersistentBlock']) \
+            -> 'PersistentBlock':
+        """Return this tree with the block at <path> replaced by the result of
+        calling <change> on it.
+
+        Only the blocks on <path> are copied; all other subtrees are shared.
+        """
+        if not path:
+            return change(self)
+        children = list(self.children)
+        children[path[0]] = children[path[0]]._replace(path[1:], change)
+        return PersistentBlock(self.level, self.max_depth, None,
+                               tuple(children))
+
+    @property
+    def grid(self) -> np.ndarray:
+        """The unit cells of this block as a read-only array of indices into
+        COLOUR_LIST, as for Block.grid.
+        """
+        if self._grid is None:
+            span = 2 ** (self.max_depth - self.level)
+            if not self._children:
+                grid = np.full((span, span), self.colour_index,
+                               dtype=np.uint8)
+            else:
+                grid = np.empty((span, span), dtype=np.uint8)
+                half = span // 2
+                for child, (dx, dy) in zip(self.children, QUADRANT_OFFSETS):
+                    grid[dx * half:(dx + 1) * half,
+                         dy * half:(dy + 1) * half] = child.grid
+            grid.flags.writeable = False
+            self._grid = grid
+        return self._grid
+
+    @property
+    def bitboards(self) -> List[int]:
+        """The unit cells of this block as one bitboard per colour, as for
+        Block.bitboards.
+        """
+        if self._bitboards is None:
+            self._bitboards = bitboards(self.grid, len(COLOUR_LIST))
+        return self._bitboards
+
+    def flatten(self) -> List[List[Tuple[int, int, int]]]:
+        """Return a two-dimensional list representing this block as columns
+        of unit cells, as Block.flatten does.
+        """
+        if not self._children:
+            span = 2 ** (self.max_depth - self.level)
+            return [[self.colour] * span for _ in range(span)]
+        flat_children = [child.flatten() for child in self.children]
+        return [upper + lower for upper, lower in
+                zip(flat_children[1], flat_children[2])] + \
+            [upper + lower for upper, lower in
+             zip(flat_children[0], flat_children[3])]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing',
+            'block', 'goal', 'player', 'renderer', 'numpy', 'bitboard'
+        ],
+        'max-attributes': 15
+    })
@@ -0,0 +1,69 @@
+import random
+from block import random_init
+from goal import BlobGoal, PerimeterGoal
+from persistent import PersistentBlock
+from renderer import COLOUR_LIST
+
+
+def test_moves_match_block() -> None:
+    """Moves on a PersistentBlock give the same boards as the same moves on
+    a Block, and leave earlier boards unchanged.
+    """
+    random.seed(2017)
+    block = random_init(0, 4)
+    board = PersistentBlock.from_block(block)
+    history = [(board, block.flatten())]
+    for _ in range(200):
+        target = block
+        while target.children and random.random() < 0.7:
+            target = random.choice(target.children)
+        path = target.path()
+        action = random.choice(['rotate', 'swap', 'smash'])
+        if action == 'rotate':
+            direction = random.choice([1, 3])
+            target.rotate(direction)
+            board = board.rotate(path, direction)
+        elif action == 'swap':
+            direction = random.randint(0, 1)
+            target.swap(direction)
+            board = board.swap(path, direction)
+        else:
+            children = target.smashed_children()
+            if target.smash(children):
+                board = board.smash(path, [PersistentBlock.from_block(child)
+                                           for child in children])
+        history.append((board, block.flatten()))
+
+    for board, flattened in history:
+        assert board.flatten() == flattened
+        assert board.grid.tolist() == [[COLOUR_LIST.index(colour)
+                                        for colour in column]
+                                       for column in flattened]
+        assert board.to_block().flatten() == flattened
+
+
+def test_goals_score_persistent_blocks() -> None:
+    """Goals score a PersistentBlock the same as the Block it was made from.
+    """
+    random.seed(148)
+    for depth in (3, 8):
+        block = random_init(0, depth)
+        board = PersistentBlock.from_block(block).rotate([1], 1)
+        block.children[1].rotate(1)
+        for colour in COLOUR_LIST:
+            for goal in (BlobGoal(colour), PerimeterGoal(colour)):
+                assert goal.score(board) == goal.score(block)
+
+
+def test_untouched_subtrees_are_shared() -> None:
+    """A move copies only the blocks on the path to the moved block.
+    """
+    random.seed(5)
+    board = PersistentBlock.from_block(random_init(0, 5))
+    while len(board.children[2].children) == 0:
+        board = PersistentBlock.from_block(random_init(0, 5))
+    moved = board.swap([2, 0], 1)
+    for i in (0, 1, 3):
+        assert moved.children[i] is board.children[i]
+    for i in (1, 2, 3):
+        assert moved.children[2].children[i] is board.children[2].children[i]
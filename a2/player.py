@@ -12,14 +12,22 @@ This file contains the player class hierarchy.
 """
 
 import random
-from typing import Optional
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
 import pygame
-from renderer import Renderer
-from block import Block
+from renderer import Renderer, colour_index
+from block import Block, apply_move, undo_move
 from goal import Goal
 
 TIME_DELAY = 600
 
+# The number of moves a SmartPlayer scores at once.  Scoring moves together
+# is cheaper per move, but no more are scored once one is as good as can be.
+SCORE_BATCH = 32
+
 
 class Player:
     """A player in the Blocky game.
@@ -133,6 +141,17 @@ class HumanPlayer(Player):
         # was actually returned.
         self._level = block.level
 
+        # The mouse wheel zooms the view about the cursor, and dragging with
+        # the middle button pans it.
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button in (2, 4, 5):
+            if event.button != 2:
+                self.renderer.zoom_view(board, 1 if event.button == 4 else -1,
+                                        event.pos)
+            return None
+        elif event.type == pygame.MOUSEMOTION and event.buttons[1]:
+            self.renderer.pan_view(board, *event.rel)
+            return None
+
         if event.type == pygame.MOUSEBUTTONDOWN:
             block.rotate(event.button)
             return 1
@@ -182,22 +201,27 @@ class HumanPlayer(Player):
         pygame.event.clear()
 
         # Keep checking the moves performed by the player until a valid move
-        # has been completed. Draw the board on every loop to draw the
-        # selected block properly on screen.
+        # has been completed.  Sleep until there are events, and draw the
+        # board again only when they change what is on screen.
+        self.renderer.draw(board, self.id)
         while True:
-            self.renderer.draw(board, self.id)
+            state = (board.revision, self._selected_block, board.position,
+                     board.size)
             # loop through all of the events within the event queue
             # (all pending events from the user input)
-            for event in pygame.event.get():
+            for event in self.renderer.wait_events():
                 if event.type == pygame.QUIT:
                     return 1
 
                 result = self.process_event(board, event)
-                self.renderer.draw(board, self.id)
                 if result is not None and result > 0:
                     # un-highlight the selected block
                     self._selected_block.highlighted = False
+                    self.renderer.draw(board, self.id)
                     return 0
+            if (board.revision, self._selected_block, board.position,
+                    board.size) != state:
+                self.renderer.draw(board, self.id)
 
 
 class RandomPlayer(Player):
@@ -234,7 +258,7 @@ class RandomPlayer(Player):
         # draw with highlight
         self.renderer.draw(board, self.id)
 
-        pygame.time.wait(TIME_DELAY)
+        self.renderer.pause(TIME_DELAY)
 
         # add available moves
         available_actions = [
@@ -279,20 +303,45 @@ class SmartPlayer(Player):
         The difficulty level for the smart player.
         This influences the number of iterations
         when deciding a move
+    workers:
+        The number of processes that score moves in parallel, or 0 to score
+        them in this process.
     """
+    # === Private Attributes ===
+    # _pool:
+    #     The worker processes, or None if they have not been started.
     difficulty_level: int
+    workers: int
+    _pool: Optional[ProcessPoolExecutor]
 
     def __init__(self, renderer: Renderer, player_id: int, goal: Goal,
-                 difficulty_level: int) -> None:
+                 difficulty_level: int, workers: int = 0) -> None:
         """Initialize this SmartPlayer with the given <renderer>, <player_id>
         <difficulty>, and <goal>.
+
+        If <workers> is positive, moves are scored by that many worker
+        processes, which are started when they are first needed.
         """
         super().__init__(renderer, player_id, goal)
         self.difficulty_level = difficulty_level
+        self.workers = workers
+        self._pool = None
 
-    def make_move(self, board: Block):
+    def make_move(self, board: Block) -> int:
         """Generates several moves depending on the difficluty, compares and
         selects the best one. Executes the selected move. 1
+
+        The candidates are distinct moves that change the cells of the
+        goal's colour, from Block.iter_moves.  If there are no more of them
+        than the difficulty allows, every one is tried; otherwise as many as
+        allowed are picked at random.  Rotating an undivided Block, which
+        keeps the score as it is, is tried last, so this player never makes
+        its score worse.
+
+        The moves are scored with Goal.score_moves, so the board is not
+        changed until the best move is made.  If this player has workers,
+        the moves are split between them; otherwise they are scored in
+        batches, and no more are scored once one reaches Goal.max_score.
         """
         num_moves: int = \
             5 if self.difficulty_level == 0 else \
@@ -302,57 +351,334 @@ class SmartPlayer(Player):
             100 if self.difficulty_level == 4 else \
             150
 
+        colour = colour_index(self.goal.colour)
+        candidates = [(block, (action, direction))
+                      for block, action, direction
+                      in board.iter_moves(colour=colour)]
+        if len(candidates) > num_moves:
+            candidates = random.sample(candidates, num_moves)
+        candidates.append((board.leaf_at(0, 0), ('rotate', 1)))
+
+        # score the moves without making them
+        if self.workers > 0:
+            scores = self._score_in_parallel(board, candidates)
+        else:
+            scores = self._score_in_batches(board, candidates)
+
         best_score: int = -1
-        best_action: tuple
+        best_move: Tuple[str, int]
         best_block: Block
-
-        for _ in range(num_moves):
-            random_block: Block = choose_random_block(board)
-            # add available moves based on random_block
-            available_actions = \
-                [
-                    (random_block.rotate, 1),
-                    (random_block.rotate, 3),
-                    (random_block.swap, 0),
-                    (random_block.swap, 1)
-                ]
-
-            choice = random.randint(0, 3)
-            action = available_actions[choice]
-
-            # get inverse choice to undo later
-            # if choice is rotate, pick other rotate to undo
-            # if choice is swap, swap again to undo
-            inverse_choice = \
-                0 if choice == 1 else\
-                1 if choice == 0 else\
-                choice
-            inverse_action = available_actions[inverse_choice]
-
-            # execute the specified action
-            action[0](action[1])
-
-            current_score = self.goal.score(board)
+        for (block, move), current_score in zip(candidates, scores):
             if current_score > best_score:
-                best_action = action
-                best_block = random_block
-
-            # execute inverse action
-            inverse_action[0](inverse_action[1])
+                best_score = current_score
+                best_move = move
+                best_block = block
 
         # Highlight and draw
         best_block.highlighted = True
         self.renderer.draw(board, self.id)
 
-        pygame.time.wait(TIME_DELAY)
+        self.renderer.pause(TIME_DELAY)
 
         # Do best move
-        best_action[0](best_action[1])
+        apply_move(best_block, *best_move)
 
         # Un-highlight and draw
         best_block.highlighted = False
         self.renderer.draw(board, self.id)
 
+        return 0
+
+    def _score_in_batches(self, board: Block,
+                          candidates: List[Tuple[Block, Tuple[str, int]]]) \
+            -> List[int]:
+        """Return the score of the first of the <candidates> on <board>, as
+        scored by this player's goal, up to the first that reaches the most
+        the goal can score on <board>, or of all of them if none does.
+        """
+        best = self.goal.max_score(board)
+        scores = []
+        for i in range(0, len(candidates), SCORE_BATCH):
+            scores.extend(self.goal.score_moves(
+                board, [(block, action, direction)
+                        for block, (action, direction)
+                        in candidates[i:i + SCORE_BATCH]]))
+            if max(scores) >= best:
+                break
+        return scores
+
+    def _score_in_parallel(self, board: Block,
+                           candidates: List[Tuple[Block, Tuple[str, int]]]) \
+            -> List[int]:
+        """Return the score of each of the <candidates> on <board>, as scored
+        by this player's goal, with the work split between the workers.
+
+        The board is pickled once and each worker scores its share of the
+        candidates on its own copy.
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        snapshot = pickle.dumps(board)
+        moves = [(block.path(), action, direction)
+                 for block, (action, direction) in candidates]
+        share = -(-len(moves) // self.workers)
+        futures = [self._pool.submit(_score_moves, snapshot, self.goal,
+                                     moves[i:i + share])
+                   for i in range(0, len(moves), share)]
+
+        scores = []
+        for future in futures:
+            scores.extend(future.result())
+        return scores
+
+    def close(self) -> None:
+        """Stop this player's workers, if they have been started.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def _score_moves(snapshot: bytes, goal: Goal,
+                 moves: List[Tuple[List[int], str, int]]) -> List[int]:
+    """Return the score of <goal> after each of <moves> on the pickled board
+    <snapshot>.
+
+    Each move is given as the path to the block it is made on, the action,
+    and the direction.  This is run by SmartPlayer's worker processes.
+    """
+    board = pickle.loads(snapshot)
+    return list(goal.score_moves(
+        board, [(board.descendant(path), action, direction)
+                for path, action, direction in moves]))
+
+
+class SearchPlayer(Player):
+    """A player that looks ahead several turns, its own and the other
+    players', and makes the move that leads to its best score.
+
+    The search is a depth-limited minimax with alpha-beta pruning.  The
+    other players are expected either to make the moves that are worst for
+    this player, or, if <opponents> is 'expectimax', to move at random like
+    a RandomPlayer, in which case the average over their moves is taken.
+    Every player can also make a move that leaves this player's colour
+    where it is.  At each turn only the <breadth> moves with the best score
+    right after the move are searched, best first, and the search is
+    deepened one turn at a time, searching the best moves of the last depth
+    first, until it reaches <depth> turns or runs out of time.
+
+    Moves are searched by making them on the board and undoing them, so the
+    board is as it was when the search ends.  Smashes are never searched.
+
+    === Public Attributes ===
+    depth:
+        The most turns to look ahead, counting this player's own move.
+    breadth:
+        The most moves searched at each turn.
+    opponents:
+        How the other players are expected to move, 'minimax' or
+        'expectimax'.
+    time_limit:
+        The number of seconds after which no deeper search is started, or
+        None to always search <depth> turns.
+    players:
+        The players of the game in turn order, as set by Game.  If this
+        player is not among them, it searches as if it played alone.
+    """
+    depth: int
+    breadth: int
+    opponents: str
+    time_limit: Optional[float]
+    players: List[Player]
+
+    def __init__(self, renderer: Renderer, player_id: int, goal: Goal,
+                 depth: int, breadth: int = 8, opponents: str = 'minimax',
+                 time_limit: Optional[float] = None,
+                 players: Optional[List[Player]] = None) -> None:
+        """Initialize this SearchPlayer with the given <renderer>,
+        <player_id>, <goal>, and search settings.
+        """
+        super().__init__(renderer, player_id, goal)
+        self.depth = depth
+        self.breadth = breadth
+        self.opponents = opponents
+        self.time_limit = time_limit
+        self.players = [] if players is None else players
+
+    def make_move(self, board: Block) -> int:
+        """Search for the best move, then make it on <board>.
+        Always returns 0: Successful
+        """
+        move = self.choose_move(board)
+        if move is None:
+            # Rotating an undivided Block keeps the board as it is.
+            move = (board.leaf_at(0, 0), 'rotate', 1)
+        block, action, direction = move
+
+        block.highlighted = True
+        self.renderer.draw(board, self.id)
+        self.renderer.pause(TIME_DELAY)
+
+        apply_move(block, action, direction)
+
+        block.highlighted = False
+        self.renderer.draw(board, self.id)
+        return 0
+
+    def choose_move(self, board: Block) -> Optional[Tuple[Block, str, int]]:
+        """Return the best move for this player on <board>, as a (block,
+        action, direction) tuple, or None if leaving this player's colour
+        where it is would be best.
+        """
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.perf_counter() + self.time_limit
+        order = self._turn_order()
+
+        # The first depth needs no search: the values are the scores.
+        moves, scores = self._ordered_moves(board, True)
+        candidates = moves + [None]
+        values = scores + [self.goal.cached_score(board)]
+        best = max(range(len(candidates)), key=lambda i: values[i])
+        for depth in range(2, self.depth + 1):
+            ranked = sorted(range(len(candidates)),
+                            key=lambda i: (i != best, -values[i]))
+            alpha = float('-inf')
+            found = [alpha] * len(candidates)
+            chosen = best
+            for i in ranked:
+                if deadline is not None and time.perf_counter() > deadline:
+                    # Keep the move of the last depth searched in full.
+                    break
+                found[i] = self._after(board, candidates[i], order, 1,
+                                       depth - 1, alpha, float('inf'))
+                # A search cut off by alpha returns a bound, which may equal
+                # alpha, so only a greater value beats the move that set it.
+                if found[i] > alpha:
+                    alpha = found[i]
+                    chosen = i
+            else:
+                values = found
+                best = chosen
+                continue
+            break
+
+        return candidates[best]
+
+    def _turn_order(self) -> List[Player]:
+        """Return the players in the order they move, starting with this
+        player.
+        """
+        if self not in self.players:
+            return [self]
+        i = self.players.index(self)
+        return self.players[i:] + self.players[:i]
+
+    def _ordered_moves(self, board: Block, maximizing: bool) \
+            -> Tuple[List[Tuple[Block, str, int]], List[int]]:
+        """Return the moves on <board> that move this player's colour, and
+        their scores for this player's goal, keeping at most <breadth>
+        moves, the highest scoring first if <maximizing> and the lowest
+        scoring first otherwise.
+        """
+        moves = list(board.iter_moves(colour=colour_index(self.goal.colour)))
+        if not moves:
+            return [], []
+        scores = self.goal.score_moves(board, moves)
+        ranked = np.argsort(-scores if maximizing else scores,
+                            kind='stable')[:self.breadth]
+        return [moves[i] for i in ranked], [int(scores[i]) for i in ranked]
+
+    def _search(self, board: Block, order: List[Player], ply: int,
+                depth: int, alpha: float, beta: float) -> float:
+        """Return the value of <board> for this player, searching <depth>
+        turns, the first of which is made by order[ply % len(order)].
+
+        Values at or below <alpha>, or at or above <beta>, cannot change the
+        choice of move, so the search may stop as soon as it finds that the
+        value is one of them.
+        """
+        if depth == 0:
+            return self.goal.cached_score(board)
+        maximizing = order[ply % len(order)] is self
+        if not maximizing and self.opponents == 'expectimax':
+            return self._expected(board, order, ply, depth)
+
+        moves, scores = self._ordered_moves(board, maximizing)
+        if depth == 1:
+            # The scores right after the moves are their values.
+            scores.append(self.goal.cached_score(board))
+            return max(scores) if maximizing else min(scores)
+
+        best = float('-inf') if maximizing else float('inf')
+        for move in moves + [None]:
+            value = self._after(board, move, order, ply + 1, depth - 1,
+                                alpha, beta)
+            if maximizing:
+                best = max(best, value)
+                alpha = max(alpha, value)
+            else:
+                best = min(best, value)
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+        return best
+
+    def _expected(self, board: Block, order: List[Player], ply: int,
+                  depth: int) -> float:
+        """Return the average value of <board> for this player over the
+        moves of a player who moves at random, searching <depth> turns, the
+        first of which is made by order[ply % len(order)].
+
+        At most <breadth> of the moves are searched, picked at random.
+
+        The moves that leave this player's colour where it is are all given
+        the value of the board with no move, which is searched once.  This
+        is a deliberate approximation.  This player's moves and scores
+        depend only on where its colour is, but a later random player picks
+        from moves listed over every colour, so its sample, and the average
+        over it, can differ between boards whose other colours differ.
+        """
+        moves = list(board.iter_moves())
+        if len(moves) > self.breadth:
+            moves = random.sample(moves, self.breadth)
+        colour = colour_index(self.goal.colour)
+        unmoved = None
+        total = 0.0
+        for block, action, direction in moves:
+            count = block.histogram[colour]
+            if count == 0 or count == sum(block.histogram):
+                if unmoved is None:
+                    unmoved = self._after(board, None, order, ply + 1,
+                                          depth - 1, float('-inf'),
+                                          float('inf'))
+                total += unmoved
+            else:
+                total += self._after(board, (block, action, direction),
+                                     order, ply + 1, depth - 1,
+                                     float('-inf'), float('inf'))
+        if not moves:
+            return self._after(board, None, order, ply + 1, depth - 1,
+                               float('-inf'), float('inf'))
+        return total / len(moves)
+
+    def _after(self, board: Block, move: Optional[Tuple[Block, str, int]],
+               order: List[Player], ply: int, depth: int, alpha: float,
+               beta: float) -> float:
+        """Return the value of <board> for this player after <move>, or with
+        this player's colour left where it is if <move> is None, searching
+        as _search does.  The board is left as it was.
+        """
+        if move is None:
+            return self._search(board, order, ply, depth, alpha, beta)
+        block, action, direction = move
+        apply_move(block, action, direction)
+        try:
+            return self._search(board, order, ply, depth, alpha, beta)
+        finally:
+            undo_move(block, action, direction)
+
 
 def choose_random_block(board: Block) -> Block:
     """Chooses and returns random block from the board, excluding most
@@ -369,7 +695,7 @@ def choose_random_block(board: Block) -> Block:
     action = random.randint(0, 4)
 
     if action == 4 or not board.children:
-        if not hasattr(board, "parent"):
+        if board.parent is None:
             # We don't want the "root block" to be picked very often,
             # makes it look boring
             return board.children[random.randint(0, 3)]
@@ -388,7 +714,7 @@ if __name__ == '__main__':
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing',
             'block', 'goal', 'player', 'renderer',
-            'pygame'
+            'pygame', 'pickle', 'concurrent.futures', 'time', 'numpy'
         ],
         'max-attributes': 10,
         'generated-members': 'pygame.*'
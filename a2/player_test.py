@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+import pygame
+from block import REARRANGING_MOVES, apply_move, undo_move
+from goal import BlobGoal, PerimeterGoal
+from player import HumanPlayer, SmartPlayer, SearchPlayer, RandomPlayer, \
+    choose_random_block
+from renderer import COLOUR_LIST, BOARD_WIDTH, NullRenderer, Renderer
+from testutil import random_board
+
+
+def test_parallel_scores_match_serial() -> None:
+    """Scoring moves in worker processes gives the same scores as scoring
+    them in this process.
+    """
+    board = random_board(4, 1001)
+    goal = BlobGoal(COLOUR_LIST[1])
+    player = SmartPlayer(NullRenderer(1), 0, goal, 3, workers=2)
+    candidates = [(choose_random_block(board),
+                   random.choice(REARRANGING_MOVES)) for _ in range(20)]
+    try:
+        parallel = player._score_in_parallel(board, candidates)
+    finally:
+        player.close()
+    assert parallel == [goal.score_move(board, block, action, direction)
+                        for block, (action, direction) in candidates]
+
+
+def test_search_player_depth_one_takes_best_score() -> None:
+    """Looking one turn ahead, a SearchPlayer makes the best scoring move,
+    or keeps its score if no move improves it.
+    """
+    board = random_board(3, 42)
+    goal = BlobGoal(COLOUR_LIST[0])
+    moves = list(board.iter_moves())
+    best = max([goal.score(board)] + list(goal.score_moves(board, moves)))
+    player = SearchPlayer(NullRenderer(1), 0, goal, 1, breadth=len(moves))
+    player.make_move(board)
+    assert goal.score(board) == best
+
+
+def test_search_player_minimax() -> None:
+    """Looking two turns ahead against an opponent, a SearchPlayer makes a
+    move whose worst outcome is the best, and leaves the board as it was
+    while searching.
+    """
+    board = random_board(2, 7)
+    goal = PerimeterGoal(COLOUR_LIST[1])
+    renderer = NullRenderer(2)
+    player = SearchPlayer(renderer, 0, goal, 2, breadth=100)
+    opponent = RandomPlayer(renderer, 1, BlobGoal(COLOUR_LIST[2]))
+    player.players = [player, opponent]
+
+    def worst_after(move: tuple) -> int:
+        if move is not None:
+            apply_move(*move)
+        worst = min([goal.score(board)] + list(
+            goal.score_moves(board, list(board.iter_moves()))))
+        if move is not None:
+            undo_move(*move)
+        return worst
+
+    values = [worst_after(move) for move in list(board.iter_moves())]
+    best = max(values + [worst_after(None)])
+    before = board.grid.copy()
+    move = player.choose_move(board)
+    assert (board.grid == before).all()
+    assert worst_after(move) == best
+
+    player.opponents = 'expectimax'
+    player.choose_move(board)
+    assert (board.grid == before).all()
+
+
+def test_search_player_ignores_bounds_equal_to_best() -> None:
+    """A move whose search was cut off at exactly the value of the best move
+    so far is not chosen over it.
+    """
+    board = random_board(2, 3)
+    goal = BlobGoal(COLOUR_LIST[0])
+    player = SearchPlayer(NullRenderer(1), 0, goal, 2)
+    score = goal.cached_score(board)
+    first, second = (board, 'swap', 0), (board, 'swap', 1)
+
+    def after(board, move, order, ply, depth, alpha, beta) -> float:
+        # <first> is worth less than <second>, but searched second with
+        # alpha set by <second>, it is cut off at a bound equal to alpha.
+        if move is first:
+            return alpha if alpha == score + 5 else score + 3
+        return score + 5 if move is second else score
+
+    player._ordered_moves = lambda board, maximizing: \
+        ([first, second], [score + 1, score + 2])
+    player._after = after
+    assert player.choose_move(board) is second
+
+
+def test_human_player_sleeps_until_events(monkeypatch) -> None:
+    """A HumanPlayer waiting for a move uses almost no CPU time and draws
+    nothing until events arrive, and then zooms, pans, changes its selection
+    and swaps as the events ask.
+    """
+    monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+    board = random_board(3, 17)
+    renderer = Renderer(1, max_fps=30)
+    try:
+        # The goal is shown in two message boxes, each closed by a click.
+        for _ in range(2):
+            pygame.event.post(pygame.event.Event(
+                pygame.MOUSEBUTTONDOWN, button=1, pos=(0, 0)))
+        player = HumanPlayer(renderer, 0, BlobGoal(COLOUR_LIST[0]))
+        draws = []
+        draw = renderer.draw
+        monkeypatch.setattr(renderer, 'draw', lambda board, player_id: (
+            draws.append(board.revision), draw(board, player_id)))
+        idle_draws = []
+
+        def send_events() -> None:
+            time.sleep(0.5)
+            idle_draws.append(len(draws))
+            for event in [
+                    pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=4,
+                                       pos=(0, 0)),
+                    pygame.event.Event(pygame.MOUSEMOTION, pos=(0, 0),
+                                       rel=(-40, -40), buttons=(0, 1, 0)),
+                    pygame.event.Event(pygame.KEYDOWN, key=pygame.K_DOWN),
+                    pygame.event.Event(pygame.KEYDOWN, key=pygame.K_h)]:
+                pygame.event.post(event)
+
+        revision = board.revision
+        sender = threading.Thread(target=send_events)
+        started = time.process_time()
+        sender.start()
+        assert player.make_move(board) == 0
+        used = time.process_time() - started
+        sender.join()
+    finally:
+        pygame.quit()
+    # Only the board as it was when the move began was drawn while idle.
+    assert idle_draws == [1]
+    assert used < 0.25
+    # The events arrive within one frame, so the board is drawn again only
+    # once the move is made.
+    assert draws == [revision, revision + 1]
+    assert player._level == 1
+    assert board.revision == revision + 1
+    assert board.size == 2 * BOARD_WIDTH
+    assert board.position == (-40, -40)
@@ -10,7 +10,8 @@ University of Toronto
 
 This file contains the Renderer class.
 """
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+import numpy as np
 import pygame
 
 WHITE = (255, 255, 255)
@@ -28,6 +29,23 @@ BOARD_WIDTH = 750
 BOARD_HEIGHT = 750
 TEXT_HEIGHT = 75
 
+# The width in pixels of the frame around each undivided block, and of the
+# frame around a highlighted block.
+FRAME_WIDTH = 3
+HIGHLIGHT_WIDTH = 5
+
+# Blocks narrower than this many pixels are drawn as one cell without a
+# frame, since a frame would cover them.
+MIN_DETAIL = 2 * FRAME_WIDTH + 1
+
+# The furthest the board can be zoomed in, as a multiple of its full size.
+MAX_ZOOM = 64
+
+# The palette of the surface a board is blitted to: the colours of
+# COLOUR_LIST, so that the grid of a board can be blitted as it is, and then
+# the colour of frames.
+FRAME_INDEX = len(COLOUR_LIST)
+
 
 def colour_name(colour: Tuple[int, int, int]) -> str:
     """Return the colour name associated with this colour value, or
@@ -39,6 +57,134 @@ def colour_name(colour: Tuple[int, int, int]) -> str:
     return ''
 
 
+def colour_index(colour: Tuple[int, int, int]) -> int:
+    """Return the index of this colour value in our colour list.
+
+    Precondition: colour is in COLOUR_LIST
+    """
+    return COLOUR_LIST.index(colour)
+
+
+class _GridBlitter:
+    """Draws boards by expanding their grids of colour indices to pixels and
+    blitting them in one go to a surface whose palette is COLOUR_LIST, with
+    the frames laid over them from a mask that is kept while the shape of
+    the board stays the same.
+    """
+    # === Private Attributes ===
+    # _pixel_key:
+    #     The position, size in pixels and width in unit cells of the board
+    #     that _pixel_offsets, _pixel_cells, _cell_starts and _board_surface
+    #     were made for.
+    # _pixel_offsets:
+    #     The columns and the rows of pixels of the board that are on the
+    #     screen, counted from the board's upper left corner.
+    # _pixel_cells:
+    #     The unit cell that each of those columns and rows falls in.
+    # _cell_starts:
+    #     The first column (and row) of pixels of each unit cell, with one
+    #     extra entry for the pixel just past the board.
+    # _board_surface:
+    #     The surface the board's pixels are blitted to.
+    # _overlay_key:
+    #     The bytes of the grid of leaf levels that _overlay was made for.
+    # _overlay:
+    #     A mask of the pixels of the board that are covered by frames.
+    _pixel_key: Optional[Tuple[int, int, int, int]]
+    _pixel_offsets: Optional[Tuple[np.ndarray, np.ndarray]]
+    _pixel_cells: Optional[Tuple[np.ndarray, np.ndarray]]
+    _cell_starts: Optional[np.ndarray]
+    _board_surface: Optional[pygame.Surface]
+    _overlay_key: Optional[bytes]
+    _overlay: Optional[np.ndarray]
+
+    def __init__(self) -> None:
+        """Initialize a blitter that has not drawn any board yet.
+        """
+        self._pixel_key = None
+        self._pixel_offsets = None
+        self._pixel_cells = None
+        self._cell_starts = None
+        self._board_surface = None
+        self._overlay_key = None
+        self._overlay = None
+
+    def draw(self, screen: pygame.Surface, board: 'Block') -> None:
+        """Draw the visible part of <board> on <screen> by blitting its grid
+        of colours.
+
+        The pixels of the board are split evenly between its unit cells.
+        """
+        x, y = board.position
+        size = board.size
+        grid = board.grid
+        width, height = screen.get_size()
+        if self._pixel_key != (x, y, size, len(grid)):
+            self._pixel_key = (x, y, size, len(grid))
+            self._pixel_offsets = (
+                np.arange(max(0, -x), min(size, width - x), dtype=np.int32),
+                np.arange(max(0, -y), min(size, height - y), dtype=np.int32))
+            self._pixel_cells = tuple(offsets * len(grid) // size
+                                      for offsets in self._pixel_offsets)
+            self._cell_starts = \
+                -(-np.arange(len(grid) + 1) * size // len(grid))
+            self._board_surface = pygame.Surface(
+                tuple(len(offsets) for offsets in self._pixel_offsets),
+                depth=8)
+            self._board_surface.set_palette(COLOUR_LIST + [BLACK])
+            self._overlay_key = None
+
+        screen.fill(WHITE)
+        columns, rows = self._pixel_cells
+        if len(columns) > 0 and len(rows) > 0:
+            levels = board.leaf_levels
+            if levels.tobytes() != self._overlay_key:
+                self._overlay = self._frame_overlay(levels)
+                self._overlay_key = levels.tobytes()
+            image = np.where(self._overlay, FRAME_INDEX,
+                             grid.take(columns, axis=0).take(rows, axis=1))
+            pygame.surfarray.blit_array(self._board_surface,
+                                        image.astype(np.uint8))
+            screen.blit(self._board_surface,
+                        (x + self._pixel_offsets[0][0],
+                         y + self._pixel_offsets[1][0]))
+
+        starts = self._cell_starts
+        for block in board.highlighted_blocks():
+            column, row, span = block.cell_bounds()
+            pygame.draw.rect(screen, TEMPTING_TURQUOISE,
+                             (x + starts[column], y + starts[row],
+                              starts[column + span] - starts[column],
+                              starts[row + span] - starts[row]),
+                             HIGHLIGHT_WIDTH)
+
+    def _frame_overlay(self, levels: np.ndarray) -> np.ndarray:
+        """Return a mask of the visible pixels covered by the frames of the
+        undivided blocks of a board whose leaves have the given <levels>.
+
+        Blocks narrower than MIN_DETAIL pixels are not framed.
+        """
+        columns, rows = self._pixel_cells
+        starts = self._cell_starts.astype(np.int32)
+        cells = np.arange(len(levels))
+        # The width in unit cells of the block that covers each cell.
+        spans = len(levels) >> levels.astype(np.int32)
+        overlay = np.zeros((len(columns), len(rows)), dtype=bool)
+        offsets = self._pixel_offsets
+        for axis, along in ((0, offsets[0][:, np.newaxis]),
+                            (1, offsets[1][np.newaxis, :])):
+            # The first and last pixels of the block covering each cell,
+            # along this axis, expanded to one entry per visible pixel.
+            first = np.expand_dims(cells, 1 - axis)
+            first = first - first % spans
+            edges = (starts[first], starts[first + spans] - 1)
+            low, high = (edge.take(columns, axis=0).take(rows, axis=1)
+                         for edge in edges)
+            overlay |= (high - low >= MIN_DETAIL - 1) & (
+                (along - low < FRAME_WIDTH) | (high - along < FRAME_WIDTH))
+        return overlay
+
+
 class Renderer:
     """
     A class designed to handle the drawing and context for the board
@@ -52,18 +198,48 @@ class Renderer:
     player_labels:
          list of player icons to display
     """
+    # === Private Attributes ===
+    # _drawn_board:
+    #     The board last drawn on the screen, or None if the screen has been
+    #     drawn over since, so that the next board must be drawn in full.
+    # _blitter:
+    #     The blitter that draws boards by blitting their grids of colours,
+    #     or None if boards are drawn by drawing their rectangles.
+    # _max_fps:
+    #     The most times a second wait_events may return, or None if there
+    #     is no limit.
+    # _clock:
+    #     The clock used to keep to _max_fps.
     displayed_image: pygame.Surface
     screen: pygame.Surface
     window_size: Tuple[int, int]
     player_labels: List[pygame.Surface]
+    _drawn_board: Optional['Block']
+    _blitter: Optional[_GridBlitter]
+    _max_fps: Optional[int]
+    _clock: pygame.time.Clock
 
-    def __init__(self, num_players: int) -> None:
+    def __init__(self, num_players: int, blit: bool = False,
+                 max_fps: Optional[int] = None) -> None:
         """Initialize this renderer.
 
         <num_players> is the total number of players in this Game.  It is
         used to render a label showing the player whose move it is at any
         given time.
+
+        If <blit> is True, each board is drawn by expanding its grid of
+        colour indices to pixels and blitting them in one go to a surface
+        whose palette is COLOUR_LIST, with the frames laid over them from a
+        mask that is kept while the shape of the board stays the same.  This
+        takes about the same time however many blocks the board has.
+        Otherwise each block is drawn as a rectangle.
+
+        If <max_fps> is not None, wait_events returns at most that many times
+        a second, so that a burst of events is handled in one batch.
         """
+        self._blitter = _GridBlitter() if blit else None
+        self._max_fps = max_fps
+        self._clock = pygame.time.Clock()
         pygame.init()
         self.displayed_image = \
             pygame.display.set_mode((BOARD_WIDTH, BOARD_HEIGHT + 75))
@@ -71,6 +247,7 @@ class Renderer:
             self.displayed_image.subsurface(((0, 0),
                                              (BOARD_WIDTH, BOARD_HEIGHT)))
         self.screen.fill(WHITE)
+        self._drawn_board = None
 
         font = pygame.font.SysFont(None, 25)
         self.player_labels = [
@@ -86,7 +263,9 @@ class Renderer:
         font = pygame.font.SysFont(None, 25)
         self.displayed_image.blit(
             font.render("LMB: rotate CW           " +
-                        "RMB: rotate CCW         ",
+                        "RMB: rotate CCW         " +
+                        "Wheel: zoom     " +
+                        "MMB drag: pan",
                         True,
                         (255, 255, 255)), (0, BOARD_HEIGHT + 25)
         )
@@ -100,29 +279,112 @@ class Renderer:
         )
 
     def draw(self, board: 'Block', player_id: int) -> None:
-        """Clear the canvas and draw the blocks."""
-        # draw the background map onto the screen
-        self.screen.fill(WHITE)
-
-        selected = []
-        for colour, pos, size, width in board.rectangles_to_draw():
-            if colour == TEMPTING_TURQUOISE:
-                selected.append((colour, pos, size, width))
-            else:
-                pygame.draw.rect(self.screen, colour, (pos, size), width)
+        """Draw the blocks.
 
-        # Draw highlighted rectangle borders last
-        for colour, x, y, width in selected:
-            pygame.draw.rect(self.screen, colour, (x, y), width)
+        Only the areas of the board that moves or highlighting have changed
+        since it was last drawn are drawn again and updated on the display,
+        unless the whole board needs to be drawn.
+        """
+        damage = board.pop_damage()
+        if self._blitter is not None:
+            self._blitter.draw(self.screen, board)
+            updated = None
+        elif damage is None or board is not self._drawn_board:
+            # draw the background map onto the screen
+            self.screen.fill(WHITE)
+            self._draw_rectangles(board)
+            updated = None
+        else:
+            for area in damage:
+                self.screen.set_clip(area)
+                self.screen.fill(WHITE)
+                self._draw_rectangles(board, area)
+            self.screen.set_clip(None)
+            updated = damage
+        self._drawn_board = board
 
-        self.displayed_image.blit(
+        label = self.displayed_image.blit(
             self.player_labels[player_id], (0, BOARD_HEIGHT))
-        pygame.display.update()
+        if updated is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(updated + [label])
 
         # Check for new events; this should avoid the OSX issue for delayed
         # updating of the pygame window.
         pygame.event.peek([])
 
+    def _draw_rectangles(self, board: 'Block',
+                         area: Optional[Tuple[int, int, int, int]] = None) \
+            -> None:
+        """Draw the rectangles of <board> that overlap <area>, or that are on
+        the screen if <area> is None.
+
+        Highlighted rectangle borders are drawn last.  Blocks smaller than
+        MIN_DETAIL pixels are drawn as one unframed cell.
+        """
+        for colour, pos, size, width in board.iter_rectangles(
+                area or self.screen.get_rect(), highlights_last=True,
+                min_size=MIN_DETAIL):
+            pygame.draw.rect(self.screen, colour, (pos, size), width)
+
+    def zoom_view(self, board: 'Block', steps: int,
+                  centre: Tuple[int, int]) -> None:
+        """Zoom in on <board> by a factor of two <steps> times, or out if
+        <steps> is negative, keeping the point of the board at <centre> on
+        the screen where it is.
+
+        The view is kept between the whole board and MAX_ZOOM times closer.
+        """
+        x, y = board.position
+        size = board.size
+        new_size = int(min(max(size * 2.0 ** steps, BOARD_WIDTH),
+                           BOARD_WIDTH * MAX_ZOOM))
+        scale = new_size / size
+        self._set_view(board, (round(centre[0] - (centre[0] - x) * scale),
+                               round(centre[1] - (centre[1] - y) * scale)),
+                       new_size)
+
+    def pan_view(self, board: 'Block', dx: int, dy: int) -> None:
+        """Move the view of <board> so that the board moves <dx> pixels right
+        and <dy> pixels down on the screen, as far as it can.
+        """
+        x, y = board.position
+        self._set_view(board, (x + dx, y + dy), board.size)
+
+    def _set_view(self, board: 'Block', position: Tuple[int, int],
+                  size: int) -> None:
+        """Lay <board> out at <position> with <size>, moved as little as
+        needed for it to cover the whole screen.
+
+        The view is the layout of the board itself, so blocks are selected
+        from the cursor position as before.
+        """
+        board.update_block_locations(
+            (min(0, max(BOARD_WIDTH - size, position[0])),
+             min(0, max(BOARD_HEIGHT - size, position[1]))), size)
+
+    def pause(self, delay: int) -> None:
+        """Wait <delay> milliseconds so that a computer player's move can be
+        followed on screen.
+        """
+        pygame.time.wait(delay)
+
+    def wait_events(self) -> List[pygame.event.Event]:
+        """Sleep until there is at least one event, and return all the
+        events that are waiting.
+
+        Nothing is done while waiting, so an idle player costs no CPU time.
+        If a frame rate cap was given, also sleep for whatever is left of the
+        current frame first, so that events arriving meanwhile are returned
+        together.
+        """
+        events = [pygame.event.wait()]
+        if self._max_fps is not None:
+            self._clock.tick(self._max_fps)
+        events.extend(pygame.event.get())
+        return events
+
     # For game start
     def display_goal(self, player: 'Player') -> None:
         """Display the goal for the given player.
@@ -139,6 +401,7 @@ class Renderer:
         """
         screen = self.screen
         screen.fill(colour)
+        self._drawn_board = None
         font = pygame.font.Font(None, 18)
         rect = pygame.Rect([0, 0, 400, 22])
         rect.center = screen.get_rect().center
@@ -155,12 +418,37 @@ class Renderer:
 
         pygame.display.flip()
 
-        # Wait for user click
-        while True:
-            events = pygame.event.get()
-            for e in events:
-                if e.type == pygame.MOUSEBUTTONDOWN:
-                    return
+        # Wait for user click, sleeping until each event arrives
+        while pygame.event.wait().type != pygame.MOUSEBUTTONDOWN:
+            pass
+
+
+class NullRenderer(Renderer):
+    """A Renderer that never opens a window or draws anything.
+
+    Used to run games headless (for example, computer-only simulations on
+    machines without a display).  It has the same interface as Renderer, but
+    every method returns immediately, and pause does not wait, so a game is
+    limited only by the cost of making and scoring moves.
+    """
+
+    def __init__(self, num_players: int) -> None:
+        """Initialize this renderer without initializing pygame.
+
+        <num_players> is accepted for compatibility with Renderer.
+        """
+        # pylint: disable=super-init-not-called
+        self.player_labels = []
+
+    def draw(self, board: 'Block', player_id: int) -> None:
+        """Do nothing."""
+
+    def pause(self, delay: int) -> None:
+        """Do nothing; headless games are never paced."""
+
+    def display_goal(self, player: 'Player') -> None:
+        """Do nothing."""
+
 
 if __name__ == '__main__':
     import python_ta
@@ -168,7 +456,7 @@ if __name__ == '__main__':
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing',
             'block', 'goal', 'player', 'renderer',
-            'pygame'
+            'pygame', 'numpy'
         ],
         'generated-members': 'pygame.*'
     })
@@ -0,0 +1,49 @@
+import threading
+import time
+import pygame
+from renderer import Renderer
+from testutil import random_board
+
+
+def test_blit_matches_rectangles(monkeypatch) -> None:
+    """Blitting a board's grid draws the same pixels as drawing its
+    rectangles, with and without a highlighted block.
+    """
+    monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+    board = random_board(3, 15, 744)
+    try:
+        for highlighted in (None, board.children[0]):
+            if highlighted is not None:
+                highlighted.highlighted = True
+            pixels = []
+            for blit in (False, True):
+                renderer = Renderer(1, blit)
+                renderer.draw(board, 0)
+                pixels.append(pygame.surfarray.array3d(renderer.screen))
+            assert (pixels[0] == pixels[1]).all()
+    finally:
+        pygame.quit()
+
+
+def test_wait_events_batches_events_within_a_frame(monkeypatch) -> None:
+    """With a frame rate cap, wait_events returns at most once a frame, with
+    every event that arrived during the frame.
+    """
+    monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+    renderer = Renderer(1, max_fps=10)
+    try:
+        pygame.event.clear()
+        pygame.event.post(pygame.event.Event(pygame.USEREVENT, n=0))
+        renderer.wait_events()
+        started = time.perf_counter()
+        pygame.event.post(pygame.event.Event(pygame.USEREVENT, n=1))
+        later = threading.Timer(0.03, pygame.event.post, [
+            pygame.event.Event(pygame.USEREVENT, n=2)])
+        later.start()
+        events = renderer.wait_events()
+        elapsed = time.perf_counter() - started
+        later.join()
+    finally:
+        pygame.quit()
+    assert [event.n for event in events] == [1, 2]
+    assert elapsed >= 0.08
@@ -0,0 +1,25 @@
+"""Helpers shared by the tests of the Blocky modules."""
+import random
+from block import Block, random_init
+from renderer import BOARD_WIDTH
+
+
+def random_board(max_depth: int, seed: int, size: int = BOARD_WIDTH) \
+        -> Block:
+    """Return a random board of depth <max_depth>, generated after seeding
+    random with <seed>, with its locations set for a board <size> pixels
+    wide.
+    """
+    random.seed(seed)
+    board = random_init(0, max_depth)
+    board.update_block_locations((0, 0), size)
+    return board
+
+
+def all_blocks(block: Block) -> list:
+    """Return every Block in the tree rooted at <block>.
+    """
+    blocks = [block]
+    for child in block.children:
+        blocks.extend(all_blocks(child))
+    return blocks
@@ -0,0 +1,148 @@
+"""Assignment 2 - Blocky
+
+=== CSC148 Fall 2017 ===
+Diane Horton and David Liu
+Department of Computer Science,
+University of Toronto
+
+
+=== Module Description ===
+
+This file contains Zobrist hashing of boards and a cache of their scores.
+
+The Zobrist hash of a board is the exclusive or of one random 64-bit key per
+unit cell, chosen by the cell's position and colour.  A move changes only
+the cells of the Block it is made on, so the hash after the move is found by
+taking out the keys of the Block's cells as they were and putting in their
+keys as they are, without looking at the rest of the board.
+
+A board and its images under the eight rotations and reflections of the
+whole board score the same for every goal.  Alongside its own hash, a board
+has seven more, each taken with the keys of the cells moved by one of these
+symmetries, which are the hashes of its images.  The smallest of the eight
+is the same for a board and all its images, and is its canonical hash.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Hashable, Optional, Tuple
+import numpy as np
+
+# The seed of the random keys.  It is fixed so that every process hashes a
+# board the same way.
+ZOBRIST_SEED = 148
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(width: int, num_colours: int) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Return the Zobrist keys of the unit cells of a board <width> cells
+    wide with <num_colours> colours, and the index of the first key of each
+    cell under each of the eight symmetries of the board.
+
+    The key of the cell at (column, row) with colour index c, as moved by
+    symmetry s, is keys[first[s, column, row] + c].  Symmetry 0 leaves every
+    cell where it is.
+    """
+    rng = np.random.default_rng(ZOBRIST_SEED + width)
+    keys = rng.integers(0, 2 ** 64, size=width * width * num_colours,
+                        dtype=np.uint64)
+    first = np.arange(width * width).reshape(width, width) * num_colours
+    first = np.stack([np.rot90(grid, turns)
+                      for grid in (first, first.T) for turns in range(4)])
+    return keys, first
+
+
+def zobrist_hash(region: np.ndarray, column: int, row: int, width: int,
+                 num_colours: int) -> int:
+    """Return the exclusive or of the Zobrist keys of the cells in the
+    colour-index grid <region>, whose upper left cell is at (<column>, <row>)
+    on a board <width> cells wide with <num_colours> colours.
+    """
+    keys, first = zobrist_keys(width, num_colours)
+    span = len(region)
+    index = first[0, column:column + span, row:row + span] + region
+    return int(np.bitwise_xor.reduce(keys[index], axis=None))
+
+
+def zobrist_hashes(region: np.ndarray, column: int, row: int, width: int,
+                   num_colours: int) -> np.ndarray:
+    """Return the exclusive or of the Zobrist keys of the cells in <region>,
+    as for zobrist_hash, under each of the eight symmetries of the board, as
+    an array of eight hashes.
+    """
+    keys, first = zobrist_keys(width, num_colours)
+    span = len(region)
+    index = first[:, column:column + span, row:row + span] + region
+    return np.bitwise_xor.reduce(keys[index].reshape(8, -1), axis=1)
+
+
+class ScoreCache:
+    """A cache of scores with a bounded number of entries.
+
+    When the cache is full, adding a score evicts the score that was least
+    recently added or found.
+
+    === Public Attributes ===
+    capacity:
+        The most scores the cache holds at once.
+    hits:
+        The number of lookups that found a score.
+    misses:
+        The number of lookups that did not.
+    """
+    # === Private Attributes ===
+    # _scores:
+    #     The scores in the cache, from the least to the most recently used.
+    capacity: int
+    hits: int
+    misses: int
+    _scores: 'OrderedDict[Hashable, Any]'
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize an empty cache that holds at most <capacity> scores.
+        """
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of scores in this cache.
+        """
+        return len(self._scores)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the score cached under <key>, or None if there is none.
+        """
+        score = self._scores.get(key)
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._scores.move_to_end(key)
+        return score
+
+    def put(self, key: Hashable, score: Any) -> None:
+        """Cache <score> under <key>, evicting the least recently used score
+        if the cache is full.
+        """
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        if len(self._scores) > self.capacity:
+            self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every score from this cache.
+        """
+        self._scores.clear()
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', 'functools', 'collections',
+            'numpy'
+        ]
+    })
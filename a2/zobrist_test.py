@@ -0,0 +1,113 @@
+import random
+import numpy as np
+from block import REARRANGING_MOVES, apply_move
+from goal import BlobGoal, SCORE_CACHE
+from renderer import COLOUR_LIST
+from testutil import all_blocks, random_board
+from zobrist import ScoreCache, zobrist_hash, zobrist_hashes
+
+
+def test_zobrist_follows_moves() -> None:
+    """The hash kept through moves is the hash of the board as it is, and
+    zobrist_after predicts it.
+    """
+    board = random_board(4, 1729)
+    for _ in range(100):
+        block = random.choice(all_blocks(board))
+        action, direction = random.choice(REARRANGING_MOVES)
+        expected = block.zobrist_after(action, direction)
+        apply_move(block, action, direction)
+        assert board.zobrist == expected
+        assert board.zobrist == zobrist_hash(board.grid, 0, 0,
+                                             len(board.grid),
+                                             len(COLOUR_LIST))
+        block = random.choice(all_blocks(board))
+        block.smash()
+        assert board.zobrist == zobrist_hash(board.grid, 0, 0,
+                                             len(board.grid),
+                                             len(COLOUR_LIST))
+
+
+def test_zobrist_tells_boards_apart() -> None:
+    """Different boards get different hashes, and equal boards equal ones.
+    """
+    hashes = {}
+    for seed in range(50):
+        board = random_board(3, seed)
+        hashes.setdefault(board.grid.tobytes(), set()).add(board.zobrist)
+    assert all(len(found) == 1 for found in hashes.values())
+    assert len(set.union(*hashes.values())) == len(hashes)
+
+
+def test_score_cache_evicts_least_recently_used() -> None:
+    """A full cache drops the score that was used least recently.
+    """
+    cache = ScoreCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_cached_score_matches_score() -> None:
+    """Scores found in the cache are the scores of the boards.
+    """
+    SCORE_CACHE.clear()
+    board = random_board(4, 9)
+    goal = BlobGoal(COLOUR_LIST[2])
+    moves = [(block, action, direction)
+             for block, action, direction in board.iter_moves()]
+    first = goal.score_moves(board, moves)
+    hits = SCORE_CACHE.hits
+    assert list(goal.score_moves(board, moves)) == list(first)
+    assert SCORE_CACHE.hits == hits + len(moves)
+    for block, action, direction in moves[:10]:
+        apply_move(block, action, direction)
+        assert goal.cached_score(board) == goal.score(board)
+
+
+def test_zobrist_hashes_are_hashes_of_images() -> None:
+    """The eight hashes of a grid are the hashes of its eight rotations and
+    reflections.
+    """
+    board = random_board(3, 314)
+    grid = board.grid
+    images = {zobrist_hash(np.rot90(image, turns), 0, 0, len(grid),
+                           len(COLOUR_LIST))
+              for image in (grid, grid.T) for turns in range(4)}
+    assert images == {int(h) for h in zobrist_hashes(
+        grid, 0, 0, len(grid), len(COLOUR_LIST))}
+
+
+def test_canonical_zobrist_ignores_rotation() -> None:
+    """Rotating the whole board keeps its canonical hash.
+    """
+    board = random_board(4, 314)
+    canonical = board.canonical_zobrist
+    for direction in (1, 3, 3, 1, 1):
+        assert board.canonical_zobrist_after('rotate', direction) == \
+            canonical
+        board.rotate(direction)
+        assert board.canonical_zobrist == canonical
+    block, action, direction = next(
+        move for move in board.iter_moves() if move[0] is not board)
+    apply_move(block, action, direction)
+    assert board.canonical_zobrist != canonical
+
+
+def test_iter_moves_canonical() -> None:
+    """With canonical set, no two moves give images of the same board, and
+    none gives an image of the board as it is.
+    """
+    board = random_board(3, 2718)
+    moves = list(board.iter_moves(canonical=True))
+    keys = [block.canonical_zobrist_after(action, direction)
+            for block, action, direction in moves]
+    assert len(set(keys)) == len(keys)
+    assert board.canonical_zobrist not in keys
+    assert all(block is not board or action == 'swap'
+               for block, action, _ in moves)